@@ -13,6 +13,22 @@ CREATE TABLE "assignments" (
 	CONSTRAINT "game_id" FOREIGN KEY("game_id") REFERENCES "games"("game_id"),
 	CONSTRAINT "player_id" FOREIGN KEY("player_id") REFERENCES "players"("player_id")
 );
+DROP TABLE IF EXISTS "character_recent_results";
+CREATE TABLE "character_recent_results" (
+	"character_id"	INTEGER NOT NULL,
+	"slot"	INTEGER NOT NULL,
+	"assignment_id"	INTEGER NOT NULL,
+	"game_id"	INTEGER NOT NULL,
+	"won"	INTEGER NOT NULL,
+	PRIMARY KEY("character_id","slot")
+) WITHOUT ROWID;
+DROP TABLE IF EXISTS "character_stats";
+CREATE TABLE "character_stats" (
+	"character_id"	INTEGER NOT NULL,
+	"games"	INTEGER NOT NULL,
+	"wins"	INTEGER NOT NULL,
+	PRIMARY KEY("character_id")
+) WITHOUT ROWID;
 DROP TABLE IF EXISTS "characters";
 CREATE TABLE "characters" (
 	"character_id"	INTEGER NOT NULL UNIQUE,
@@ -32,6 +48,39 @@ CREATE TABLE "games" (
 	PRIMARY KEY("game_id" AUTOINCREMENT),
 	CONSTRAINT "script_id" FOREIGN KEY("script_id") REFERENCES "scripts"("script_id")
 );
+DROP TABLE IF EXISTS "model_fits";
+CREATE TABLE "model_fits" (
+	"fingerprint"	TEXT NOT NULL,
+	"weighted_elo"	REAL NOT NULL,
+	"weighted_strength"	REAL NOT NULL,
+	"intercept"	REAL NOT NULL,
+	PRIMARY KEY("fingerprint")
+);
+DROP TABLE IF EXISTS "player_alignment_stats";
+CREATE TABLE "player_alignment_stats" (
+	"player_id"	INTEGER NOT NULL,
+	"team"	TEXT NOT NULL,
+	"games"	INTEGER NOT NULL,
+	"wins"	INTEGER NOT NULL,
+	PRIMARY KEY("player_id","team")
+) WITHOUT ROWID;
+DROP TABLE IF EXISTS "player_character_stats";
+CREATE TABLE "player_character_stats" (
+	"player_id"	INTEGER NOT NULL,
+	"character_id"	INTEGER NOT NULL,
+	"team"	TEXT NOT NULL,
+	"games"	INTEGER NOT NULL,
+	"wins"	INTEGER NOT NULL,
+	PRIMARY KEY("player_id","character_id","team")
+) WITHOUT ROWID;
+DROP TABLE IF EXISTS "player_recent_teams";
+CREATE TABLE "player_recent_teams" (
+	"player_id"	INTEGER NOT NULL,
+	"slot"	INTEGER NOT NULL,
+	"assignment_id"	INTEGER NOT NULL,
+	"team"	TEXT NOT NULL,
+	PRIMARY KEY("player_id","slot")
+) WITHOUT ROWID;
 DROP TABLE IF EXISTS "players";
 CREATE TABLE "players" (
 	"player_id"	INTEGER NOT NULL UNIQUE,
@@ -40,6 +89,14 @@ CREATE TABLE "players" (
 	"elo_evil"	REAL NOT NULL DEFAULT 1500,
 	PRIMARY KEY("player_id" AUTOINCREMENT)
 );
+DROP TABLE IF EXISTS "rating_snapshots";
+CREATE TABLE "rating_snapshots" (
+	"player_id"	INTEGER NOT NULL,
+	"game_id"	INTEGER NOT NULL,
+	"elo_good"	REAL NOT NULL,
+	"elo_evil"	REAL NOT NULL,
+	PRIMARY KEY("player_id","game_id")
+) WITHOUT ROWID;
 DROP TABLE IF EXISTS "script_characters";
 CREATE TABLE "script_characters" (
 	"script_id"	INTEGER,
@@ -764,7 +821,6 @@ INSERT INTO "script_characters" VALUES (44,127);
 INSERT INTO "script_characters" VALUES (43,121);
 INSERT INTO "script_characters" VALUES (43,86);
 INSERT INTO "script_characters" VALUES (43,135);
-INSERT INTO "script_characters" VALUES (43,86);
 INSERT INTO "script_characters" VALUES (43,82);
 INSERT INTO "script_characters" VALUES (43,92);
 INSERT INTO "script_characters" VALUES (46,3);
@@ -842,4 +898,16 @@ INSERT INTO "type_distribution" VALUES (12,7,2,2,1);
 INSERT INTO "type_distribution" VALUES (13,9,0,3,1);
 INSERT INTO "type_distribution" VALUES (14,9,1,3,1);
 INSERT INTO "type_distribution" VALUES (15,9,2,3,1);
+CREATE UNIQUE INDEX "idx_script_characters_script_character" ON "script_characters" ("script_id", "character_id");
+CREATE INDEX "idx_assignments_player" ON "assignments" ("player_id", "assignment_id");
+CREATE INDEX "idx_assignments_character" ON "assignments" ("character_id", "game_id");
+CREATE INDEX "idx_assignments_game" ON "assignments" ("game_id", "player_id");
+CREATE INDEX "idx_players_name" ON "players" ("name");
+CREATE INDEX "idx_characters_name" ON "characters" ("name");
+CREATE INDEX "idx_scripts_name" ON "scripts" ("name");
+-- The tables from migrations 3 and 4 (db_setup.migrations) are included but left empty, and user_version
+-- stays at 2 on purpose: get_connection then runs migration 3, which backfills the aggregate tables from
+-- the history above, and migration 4, whose table already exists. Run elo.replay_ratings() to fill
+-- rating_snapshots for that history.
+PRAGMA user_version = 2;
 COMMIT;
@@ -0,0 +1,46 @@
+## AGGREGATES ##
+# Running summaries of the assignments table, updated as each result is recorded, so the setup
+# path reads O(players + characters) rows instead of the whole history. Tables are created and
+# backfilled by the db_setup migrations.
+import db_setup
+
+
+## Folds one newly inserted assignment into every aggregate table (caller commits)
+def record_assignment(cur, assignment_id, game_id, player_id, character_id, team, won):
+    cur.execute("""
+    INSERT INTO player_alignment_stats (player_id, team, games, wins)
+    VALUES(?, ?, 1, ?)
+    ON CONFLICT (player_id, team) DO UPDATE SET games = games + 1, wins = wins + excluded.wins;
+    """, (player_id, team, won))
+
+    cur.execute("""
+    INSERT INTO player_character_stats (player_id, character_id, team, games, wins)
+    VALUES(?, ?, ?, 1, ?)
+    ON CONFLICT (player_id, character_id, team) DO UPDATE SET games = games + 1, wins = wins + excluded.wins;
+    """, (player_id, character_id, team, won))
+
+    cur.execute("""
+    INSERT INTO character_stats (character_id, games, wins)
+    VALUES(?, 1, ?)
+    ON CONFLICT (character_id) DO UPDATE SET games = games + 1, wins = wins + excluded.wins;
+    """, (character_id, won))
+
+    # Ring buffers: the n-th result overwrites slot (n - 1) % window, i.e. the oldest one kept
+    cur.execute("SELECT SUM(games) FROM player_alignment_stats WHERE player_id = ?", (player_id,))
+    player_games = cur.fetchone()[0]
+    cur.execute("""
+    INSERT OR REPLACE INTO player_recent_teams (player_id, slot, assignment_id, team)
+    VALUES(?, ?, ?, ?);
+    """, (player_id, (player_games - 1) % db_setup.AGGREGATE_WINDOW, assignment_id, team))
+
+    cur.execute("SELECT games FROM character_stats WHERE character_id = ?", (character_id,))
+    character_games = cur.fetchone()[0]
+    cur.execute("""
+    INSERT OR REPLACE INTO character_recent_results (character_id, slot, assignment_id, game_id, won)
+    VALUES(?, ?, ?, ?, ?);
+    """, (character_id, (character_games - 1) % db_setup.AGGREGATE_WINDOW, assignment_id, game_id, won))
+
+
+## Recomputes every aggregate table from scratch, e.g. after assignments were edited by hand
+def rebuild_aggregates(con):
+    con.executescript("BEGIN;" + db_setup.aggregate_backfill + "COMMIT;")
@@ -0,0 +1,651 @@
+## BENCHMARKS ##
+# Run with: python benchmarks.py <name> [<name> ...]   (no name runs them all)
+import os
+import sys
+import time
+import subprocess
+import statistics
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+## Times a callable, returning the best and median of several runs in seconds
+def _time_runs(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+# ----------------------------
+# Cold start per menu path
+# ----------------------------
+# What each menu option has to import before it can start taking input
+cold_start_paths = {
+    "python only": "pass",
+    "menu": "import main",
+    "A = Set up game": "import main; main.load_option('a'); import calcs",
+    "B = Add game results": "import main; main.load_option('b')",
+    "C = Add new player": "import main; main.load_option('c')",
+    "D = Add new script": "import main; main.load_option('d')",
+    "E = Import game results": "import main; main.load_option('e')",
+}
+
+
+def bench_cold_start(repeats=5):
+    print(f"{'Menu path':<24}{'best (s)':>10}{'median (s)':>12}")
+    for label, code in cold_start_paths.items():
+        run = lambda: subprocess.run([sys.executable, "-c", code], cwd=script_dir, check=True)
+        best, median = _time_runs(run, repeats)
+        print(f"{label:<24}{best:>10.3f}{median:>12.3f}")
+
+
+# ----------------------------
+# Recent team history: per-player queries vs one window query
+# ----------------------------
+## The original N-round-trip fetch, kept here as the baseline
+def _recent_history_per_player(cur, player_ids):
+    recent_history = {}
+    for player in player_ids:
+        cur.execute("""
+        SELECT player_id, team
+        FROM assignments
+        WHERE player_id = ?
+        ORDER BY assignment_id DESC
+        LIMIT 10;
+        """, (player,))
+        teams = [team for _, team in cur.fetchall()]
+        recent_history[player] = teams if teams else ['Good'] * 10
+    return recent_history
+
+
+def bench_recent_history(repeats=20):
+    import db_setup
+    from calcs import fetch_recent_history
+    from synthetic_db import build_synthetic_db
+
+    print(f"{'assignments':>12}{'players':>9}{'per-player (ms)':>17}{'window (ms)':>13}")
+    for num_assignments in (1_000, 10_000, 100_000, 1_000_000):
+        cur = db_setup.get_connection(build_synthetic_db(num_assignments)).cursor()
+        for num_players in (5, 10, 15, 20):
+            player_ids = list(range(1, num_players + 1))
+            assert _recent_history_per_player(cur, player_ids) == fetch_recent_history(cur, player_ids)
+            per_player, _ = _time_runs(lambda: _recent_history_per_player(cur, player_ids), repeats)
+            window, _ = _time_runs(lambda: fetch_recent_history(cur, player_ids), repeats)
+            print(f"{num_assignments:>12}{num_players:>9}{per_player * 1000:>17.3f}{window * 1000:>13.3f}")
+
+
+# ----------------------------
+# Model feature prep: per-row DataFrame.apply lookups vs id -> position arrays
+# ----------------------------
+## The original feature prep from calcs.assignments, kept here as the baseline
+def _feature_prep_apply(game_data, players, characters):
+    from calcs import normaliseElo, normaliseBaseStrength
+
+    def getNormalisedElo(row):
+        player = players.loc[players['player_id'] == row['player_id']].iloc[0]
+        return normaliseElo(player['elo_good'] if row['alignment'] == 'Good' else player['elo_evil'])
+
+    game_data['normalized_elo'] = game_data.apply(getNormalisedElo, axis=1)
+
+    def getNormalisedStrength(cid):
+        strength = characters.loc[characters['character_id'] == cid, 'base_strength'].values[0]
+        return normaliseBaseStrength(strength)
+
+    game_data['normalized_strength'] = game_data['character_id'].map(getNormalisedStrength)
+    return game_data
+
+
+def bench_feature_prep(num_assignments=100_000, repeats=3):
+    import numpy as np
+    import pandas as pd
+    import db_setup
+    from calcs import add_model_features
+    from synthetic_db import build_synthetic_db
+
+    con = db_setup.get_connection(build_synthetic_db(num_assignments))
+    game_data = pd.read_sql("SELECT player_id, character_id, team AS alignment, won FROM assignments", con)
+    players = pd.read_sql("SELECT player_id, name, elo_good, elo_evil FROM players", con)
+    characters = pd.read_sql("SELECT character_id, name, alignment, base_strength, role_type FROM characters", con)
+
+    # The apply version takes about a minute at 100k rows, so it is only run once
+    start = time.perf_counter()
+    before = _feature_prep_apply(game_data.copy(), players, characters)
+    apply_time = time.perf_counter() - start
+    after = add_model_features(game_data.copy(), players, characters)
+    assert np.allclose(before['normalized_elo'], after['normalized_elo'])
+    assert np.allclose(before['normalized_strength'], after['normalized_strength'])
+    take_time, _ = _time_runs(lambda: add_model_features(game_data.copy(), players, characters), repeats)
+    print(f"{len(game_data)} assignment rows, {len(players)} players, {len(characters)} characters")
+    print(f"{'apply/map (before)':<24}{apply_time * 1000:>12.1f} ms")
+    print(f"{'np.take (after)':<24}{take_time * 1000:>12.1f} ms")
+
+
+# ----------------------------
+# MILP build: dense lpSum grid vs sparse formulation builder
+# ----------------------------
+## The original dense build from calcs.assignments (without character rules), kept here as the baseline
+def _build_dense_model(characters, player_requirements, S, B, noise):
+    from pulp import LpProblem, LpVariable, LpMinimize, lpSum, LpBinary
+
+    num_players, num_characters = S.shape
+    prob = LpProblem("CharacterAssignment", LpMinimize)
+    x = [[LpVariable(f"x_{i}_{j}", cat=LpBinary) for j in range(num_characters)] for i in range(num_players)]
+    for i in range(num_players):
+        prob += lpSum(x[i][j] for j in range(num_characters)) == 1
+    for j in range(num_characters):
+        prob += lpSum(x[i][j] for i in range(num_players)) <= 1
+    for role_type in ['Townsfolk', 'Outsider', 'Minion', 'Demon']:
+        role_mask = [1 if characters.loc[j, 'role_type'] == role_type else 0 for j in range(num_characters)]
+        role_count = lpSum(x[i][j] * role_mask[j] for i in range(num_players) for j in range(num_characters))
+        prob += role_count == player_requirements[role_type]
+    team_sign = [1 if characters.loc[j, 'alignment'] == 'Good' else -1 for j in range(num_characters)]
+    good_total = lpSum(x[i][j] * S[i][j] for i in range(num_players) for j in range(num_characters) if team_sign[j] == 1)
+    evil_total = lpSum(x[i][j] * S[i][j] for i in range(num_players) for j in range(num_characters) if team_sign[j] == -1)
+    num_good_chars = sum(1 for j in range(num_characters) if team_sign[j] == 1)
+    num_evil_chars = sum(1 for j in range(num_characters) if team_sign[j] == -1)
+    av_good = good_total / (num_good_chars if num_good_chars > 0 else 1)
+    av_evil = evil_total / (num_evil_chars if num_evil_chars > 0 else 1)
+    bias_score = lpSum(x[i][j] * B[i][j] for i in range(num_players) for j in range(num_characters))
+    excess = LpVariable("excess_imbalance", lowBound=0)
+    prob += av_good - av_evil <= 1.0 + excess
+    prob += av_evil - av_good <= 1.0 + excess
+    prob += excess - bias_score + lpSum(noise[i][j] * x[i][j] for i in range(num_players) for j in range(num_characters))
+    return prob
+
+
+def _build_sparse_model(characters, player_requirements, S, B, noise):
+    import formulation
+
+    num_players, num_characters = S.shape
+    pruned = formulation.prunable_columns(characters, player_requirements)
+    prob, x = formulation.create_grid(num_players, num_characters, pruned)
+    formulation.add_assignment_rows(prob, x)
+    roles, teams = formulation.column_groups(characters)
+    formulation.add_role_rows(prob, x, roles, player_requirements, player_requirements)
+    formulation.add_balance_and_objective(prob, x, S, B, noise, teams)
+    return prob
+
+
+## Random players x characters problem with a realistic role mix for the given table size
+def _random_problem(num_players, num_characters, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    demons, minions = 4, 5
+    outsiders = 6
+    role_types = (['Demon'] * demons + ['Minion'] * minions + ['Outsider'] * outsiders +
+                  ['Townsfolk'] * (num_characters - demons - minions - outsiders))
+    characters = pd.DataFrame({
+        'character_id': range(num_characters),
+        'name': [f"Character{j}" for j in range(num_characters)],
+        'alignment': ['Evil' if r in ('Demon', 'Minion') else 'Good' for r in role_types],
+        'base_strength': rng.uniform(30, 70, num_characters),
+        'role_type': role_types,
+    })
+    num_minions = min(minions, max(1, (num_players - 4) // 3))
+    num_outsiders = min(outsiders, 2)
+    player_requirements = {'Demon': 1, 'Minion': num_minions, 'Outsider': num_outsiders,
+                           'Townsfolk': num_players - 1 - num_minions - num_outsiders}
+    S = rng.uniform(0.4, 0.7, size=(num_players, num_characters))
+    B = rng.uniform(0, 2, size=(num_players, num_characters))
+    noise = rng.uniform(-0.05, 0.05, size=(num_players, num_characters))
+    return characters, player_requirements, S, B, noise
+
+
+def bench_model_build(repeats=5):
+    from pulp import value
+    import solver
+
+    print(f"{'players':>8}{'characters':>12}{'dense (ms)':>12}{'sparse (ms)':>13}{'same optimum':>14}")
+    for num_players, num_characters in ((10, 25), (15, 30), (20, 33), (20, 40)):
+        problem = _random_problem(num_players, num_characters)
+        dense, _ = _time_runs(lambda: _build_dense_model(*problem), repeats)
+        sparse, _ = _time_runs(lambda: _build_sparse_model(*problem), repeats)
+        dense_prob = _build_dense_model(*problem)
+        sparse_prob = _build_sparse_model(*problem)
+        solver.solve(dense_prob, {"time_limit": 60})
+        solver.solve(sparse_prob, {"time_limit": 60})
+        same = abs(value(dense_prob.objective) - value(sparse_prob.objective)) < 1e-6
+        print(f"{num_players:>8}{num_characters:>12}{dense * 1000:>12.1f}{sparse * 1000:>13.1f}{str(same):>14}")
+
+
+# ----------------------------
+# Assignment engines: one MILP vs character selection + linear assignment
+# ----------------------------
+## Builds and solves a random problem with the given engine; returns (objective, excess, seconds)
+def _solve_with_engine(engine, characters, player_requirements, S, B, noise):
+    import formulation
+    import solver
+    import two_stage
+
+    start = time.perf_counter()
+    num_players, num_characters = S.shape
+    roles, teams = formulation.column_groups(characters)
+    if engine == "two_stage":
+        prob, x = two_stage.create_selection_grid(num_players, num_characters)
+        formulation.add_role_rows(prob, x, roles, player_requirements, player_requirements)
+        two_stage.solve(prob, x, S, B, noise, teams, settings={"time_limit": 60})
+    else:
+        pruned = formulation.prunable_columns(characters, player_requirements)
+        prob, x = formulation.create_grid(num_players, num_characters, pruned)
+        formulation.add_assignment_rows(prob, x)
+        formulation.add_role_rows(prob, x, roles, player_requirements, player_requirements)
+        formulation.add_balance_and_objective(prob, x, S, B, noise, teams)
+        solver.solve(prob, {"time_limit": 60})
+    elapsed = time.perf_counter() - start
+    pairs = solver.chosen_pairs(x)
+    return (two_stage.pair_objective(pairs, S, B, noise, teams), formulation.excess_imbalance(pairs, S, teams),
+            elapsed)
+
+
+def bench_two_stage(seeds=5):
+    import statistics as stats
+
+    print(f"{'players':>8}{'characters':>12}{'milp (ms)':>11}{'2-stage (ms)':>14}"
+          f"{'milp obj':>10}{'2-stage obj':>13}{'gap':>8}{'excess':>8}")
+    for num_players, num_characters in ((5, 25), (10, 25), (15, 30), (20, 40), (30, 60), (50, 100)):
+        rows = []
+        for seed in range(seeds):
+            problem = _random_problem(num_players, num_characters, seed)
+            milp_obj, _, milp_time = _solve_with_engine("milp", *problem)
+            two_obj, two_excess, two_time = _solve_with_engine("two_stage", *problem)
+            rows.append((milp_time, two_time, milp_obj, two_obj, (two_obj - milp_obj) / abs(milp_obj), two_excess))
+        milp_time, two_time, milp_obj, two_obj, gap, excess = (stats.median(column) for column in zip(*rows))
+        print(f"{num_players:>8}{num_characters:>12}{milp_time * 1000:>11.1f}{two_time * 1000:>14.1f}"
+              f"{milp_obj:>10.3f}{two_obj:>13.3f}{gap:>8.2%}{excess:>8.3f}")
+
+
+# ----------------------------
+# End-to-end headless assignment generation
+# ----------------------------
+def bench_generate(num_assignments=100_000, seeds=10):
+    import io
+    import contextlib
+    import db_setup
+    import calcs
+    from synthetic_db import build_synthetic_db
+
+    db_setup.db_path = build_synthetic_db(num_assignments)
+    print(f"{'script':<18}{'players':>8}{'load (ms)':>11}{'milp (ms)':>11}{'2-stage (ms)':>14}")
+    for script in ("Trouble_brewing", "Bad_moon_rising", "Sects_and_violets"):
+        for num_players in (7, 10, 15):
+            player_list = [f"Player{i}" for i in range(1, num_players + 1)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                load, _ = _time_runs(lambda: calcs.load_problem(script, player_list), 1)
+                problem = calcs.load_problem(script, player_list)
+                timings = {}
+                for engine in ("milp", "two_stage"):
+                    runs = [(lambda seed=seed: calcs.generate_assignment(problem, seed, engine=engine)) for seed in range(seeds)]
+                    timings[engine] = statistics.median(_time_runs(run, 1)[0] for run in runs)
+            print(f"{script:<18}{num_players:>8}{load * 1000:>11.1f}{timings['milp'] * 1000:>11.1f}"
+                  f"{timings['two_stage'] * 1000:>14.1f}")
+
+
+# ----------------------------
+# Elo updates: per-player statements vs one set-based update per game
+# ----------------------------
+## The original eloUpdate: team averages by IN lists, then a SELECT and an UPDATE per player
+def _elo_update_per_player(con, game_id, k=24):
+    cur = con.cursor()
+    cur.execute("SELECT player_id, team, won FROM assignments WHERE game_id = ?;", (game_id,))
+    all_assignments = cur.fetchall()
+    good_ids = [pid for pid, team, _ in all_assignments if team == "Good"]
+    evil_ids = [pid for pid, team, _ in all_assignments if team == "Evil"]
+    avg_good_elo = avg_evil_elo = 1500
+    if good_ids:
+        cur.execute(f"SELECT AVG(elo_good) FROM players WHERE player_id IN ({','.join(map(str, good_ids))})")
+        avg_good_elo = cur.fetchone()[0]
+    if evil_ids:
+        cur.execute(f"SELECT AVG(elo_evil) FROM players WHERE player_id IN ({','.join(map(str, evil_ids))})")
+        avg_evil_elo = cur.fetchone()[0]
+    for player_id, team, won in all_assignments:
+        column, opponent_elo = ("elo_good", avg_evil_elo) if team == "Good" else ("elo_evil", avg_good_elo)
+        cur.execute(f"SELECT {column} FROM players WHERE player_id = ?", (player_id,))
+        player_elo = cur.fetchone()[0]
+        expected_score = 1 / (1 + 10 ** ((opponent_elo - player_elo) / 400))
+        cur.execute(f"UPDATE players SET {column} = ? WHERE player_id = ?", (int(player_elo + k * (won - expected_score)), player_id))
+    con.commit()
+
+
+## Recomputes every rating from the start of a synthetic history with both updates and checks they agree
+def bench_elo(num_assignments=20_000):
+    import io
+    import sqlite3
+    import contextlib
+    import db_setup
+    import post_game_data_collection
+    from synthetic_db import build_synthetic_db
+
+    disk = sqlite3.connect(build_synthetic_db(num_assignments))
+    per_player_con = sqlite3.connect(":memory:")
+    disk.backup(per_player_con)
+    db_setup.db_path = ":memory:"
+    set_based_con = db_setup.get_connection()
+    disk.backup(set_based_con)
+    disk.close()
+    db_setup.migrate(set_based_con)
+
+    game_ids = [row[0] for row in per_player_con.execute("SELECT game_id FROM games ORDER BY game_id")]
+    start = time.perf_counter()
+    for game_id in game_ids:
+        _elo_update_per_player(per_player_con, game_id)
+    per_player = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for game_id in game_ids:
+            post_game_data_collection.eloUpdate(game_id)
+    set_based = time.perf_counter() - start
+
+    ratings = "SELECT player_id, elo_good, elo_evil FROM players ORDER BY player_id"
+    same = per_player_con.execute(ratings).fetchall() == set_based_con.execute(ratings).fetchall()
+    print(f"{'games':>8}{'per-player (ms)':>17}{'set-based (ms)':>16}{'per game (us)':>15}{'same ratings':>14}")
+    print(f"{len(game_ids):>8}{per_player * 1000:>17.1f}{set_based * 1000:>16.1f}"
+          f"{set_based / len(game_ids) * 1e6:>15.1f}{str(same):>14}")
+
+
+## Checks a full replay reproduces the game-by-game updates exactly, then times re-rating a large history
+def bench_replay(check_assignments=20_000, num_assignments=1_000_000):
+    import io
+    import sqlite3
+    import contextlib
+    import db_setup
+    import elo
+    import post_game_data_collection
+    from synthetic_db import build_synthetic_db
+
+    # Game-by-game eloUpdate from the synthetic starting ratings, then a replay from the same start
+    disk = sqlite3.connect(build_synthetic_db(check_assignments))
+    db_setup.db_path = ":memory:"
+    con = db_setup.get_connection()
+    disk.backup(con)
+    disk.close()
+    db_setup.migrate(con)
+    con.execute("INSERT INTO rating_snapshots (player_id, game_id, elo_good, elo_evil) "
+                "SELECT player_id, 0, elo_good, elo_evil FROM players")
+    con.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for (game_id,) in con.execute("SELECT game_id FROM games ORDER BY game_id").fetchall():
+            post_game_data_collection.eloUpdate(game_id)
+    ratings = "SELECT player_id, elo_good, elo_evil FROM players ORDER BY player_id"
+    snapshots = "SELECT * FROM rating_snapshots ORDER BY player_id, game_id"
+    incremental = con.execute(ratings).fetchall(), con.execute(snapshots).fetchall()
+    elo.replay_ratings()
+    same = (con.execute(ratings).fetchall(), con.execute(snapshots).fetchall()) == incremental
+
+    db_setup.db_path = build_synthetic_db(num_assignments)
+    games, players, seconds = elo.replay_ratings()
+    print(f"{'games':>8}{'players':>9}{'replay (s)':>12}{'per game (us)':>15}{'matches eloUpdate':>19}")
+    print(f"{games:>8}{players:>9}{seconds:>12.2f}{seconds / games * 1e6:>15.1f}{str(same):>19}")
+
+
+# ----------------------------
+# Character strengths: per player vs once per game
+# ----------------------------
+## The original compute_adjusted_strength: after each player's result, the character's last 10 results
+## straight from the assignments history
+def _strength_per_player(con, character_id, decay_factor=0.3):
+    historical_strength = con.execute("SELECT base_strength FROM characters WHERE character_id = ?", (character_id,)).fetchone()[0]
+    recent_games = con.execute("""
+    SELECT a.won, c.alignment
+    FROM assignments a
+    JOIN characters c ON a.character_id = c.character_id
+    WHERE a.character_id = ?
+    ORDER BY a.game_id DESC
+    LIMIT 10
+    """, (character_id,)).fetchall()
+    if not recent_games:
+        return
+    recent_strength = 50 + (sum(row[0] for row in recent_games) / len(recent_games) - 0.5) * 50
+    adjusted_strength = round(decay_factor * recent_strength + (1 - decay_factor) * historical_strength, 2)
+    con.execute("UPDATE characters SET base_strength = ? WHERE character_id = ?;", (adjusted_strength, character_id))
+    con.commit()
+
+
+## Replays the first num_games games of a synthetic history into two empty copies, entering each game the
+## way dataCollection did (each player's result inserted, then the original per-player strength update)
+## and the way it does now (the game's results and aggregates, then one update_character_strengths).
+## Only the strength updates are timed. Synthetic games never seat a character twice, so the strengths
+## must match; on real data the per-game update also stops double decays.
+def bench_strength(num_assignments=20_000, num_games=2_000):
+    import sqlite3
+    import itertools
+    import db_setup
+    import post_game_data_collection
+    from aggregates import record_assignment, rebuild_aggregates
+    from synthetic_db import build_synthetic_db
+
+    disk = sqlite3.connect(build_synthetic_db(num_assignments))
+    rows = disk.execute("SELECT game_id, player_id, character_id, team, won, assigned_by FROM assignments "
+                        "WHERE game_id <= ? ORDER BY game_id, assignment_id", (num_games,)).fetchall()
+    per_player_con = sqlite3.connect(":memory:")
+    disk.backup(per_player_con)
+    disk.close()
+    db_setup.migrate(per_player_con)
+    per_player_con.execute("DELETE FROM assignments")
+    per_player_con.commit()
+    rebuild_aggregates(per_player_con)
+    db_setup.db_path = ":memory:"
+    per_game_con = db_setup.get_connection()
+    per_player_con.backup(per_game_con)
+
+    insert = "INSERT INTO assignments (game_id, player_id, character_id, team, won, assigned_by) VALUES(?, ?, ?, ?, ?, ?)"
+    per_player = 0.0
+    for row in rows:
+        per_player_con.execute(insert, row)
+        per_player_con.commit()
+        start = time.perf_counter()
+        _strength_per_player(per_player_con, row[2])
+        per_player += time.perf_counter() - start
+
+    per_game = 0.0
+    cur = per_game_con.cursor()
+    for game_id, game_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        for row in game_rows:
+            cur.execute(insert, row)
+            record_assignment(cur, cur.lastrowid, *row[:5])
+        per_game_con.commit()
+        start = time.perf_counter()
+        post_game_data_collection.update_character_strengths(game_id)
+        per_game += time.perf_counter() - start
+
+    strengths = "SELECT character_id, base_strength FROM characters ORDER BY character_id"
+    same = per_player_con.execute(strengths).fetchall() == per_game_con.execute(strengths).fetchall()
+    print(f"{'games':>8}{'per-player (ms)':>17}{'per-game (ms)':>15}{'same strengths':>16}")
+    print(f"{num_games:>8}{per_player * 1000:>17.1f}{per_game * 1000:>15.1f}{str(same):>16}")
+
+
+## Exports a synthetic history to CSV, then enters it into an empty copy game by game (as dataCollection
+## does) and bulk imports it into another; checks both end with the same games, aggregates and ratings
+def bench_import(num_assignments=20_000):
+    import io
+    import csv
+    import shutil
+    import sqlite3
+    import tempfile
+    import itertools
+    import contextlib
+    import db_setup
+    import bulk_import
+    import post_game_data_collection
+    from aggregates import record_assignment
+    from synthetic_db import build_synthetic_db
+
+    folder = tempfile.mkdtemp()
+    source = sqlite3.connect(build_synthetic_db(num_assignments))
+    csv_path = os.path.join(folder, "games.csv")
+    with open(csv_path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['game', 'script', 'winning_team', 'players_alive', 'player', 'character', 'team', 'assigned_by'])
+        writer.writerows(source.execute("""
+        SELECT game_id, scripts.name, winning_team, players_alive, players.name, characters.name, team, assigned_by
+        FROM assignments JOIN games USING (game_id) JOIN scripts USING (script_id)
+        JOIN players USING (player_id) JOIN characters USING (character_id)
+        ORDER BY game_id, assignment_id;
+        """))
+    rows = source.execute("SELECT game_id, player_id, character_id, team, won, assigned_by FROM assignments "
+                          "ORDER BY game_id, assignment_id").fetchall()
+    games = source.execute("SELECT * FROM games ORDER BY game_id").fetchall()
+
+    # Two copies with the players, characters and scripts but no history
+    paths = {}
+    for name in ["per_game", "bulk"]:
+        paths[name] = os.path.join(folder, f"{name}.db")
+        copy = sqlite3.connect(paths[name])
+        source.backup(copy)
+        copy.execute("DELETE FROM assignments")
+        copy.execute("DELETE FROM games")
+        copy.commit()
+        db_setup.migrate(copy)
+        copy.close()
+    source.close()
+
+    db_setup.db_path = paths["per_game"]
+    con = db_setup.get_connection()
+    cur = con.cursor()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for game, (_, game_rows) in zip(games, itertools.groupby(rows, key=lambda row: row[0])):
+            cur.execute("INSERT INTO games (game_id, script_id, winning_team, player_count, players_alive) "
+                        "VALUES(?, ?, ?, ?, ?)", game)
+            con.commit()
+            for row in game_rows:
+                cur.execute("INSERT INTO assignments (game_id, player_id, character_id, team, won, assigned_by) "
+                            "VALUES(?, ?, ?, ?, ?, ?)", row)
+                record_assignment(cur, cur.lastrowid, *row[:5])
+                con.commit()
+            post_game_data_collection.eloUpdate(game[0])
+    per_game = time.perf_counter() - start
+
+    db_setup.db_path = paths["bulk"]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = bulk_import.import_results(csv_path)
+    bulk = time.perf_counter() - start
+
+    checks = ["SELECT * FROM games ORDER BY game_id",
+              "SELECT * FROM assignments ORDER BY assignment_id",
+              "SELECT * FROM player_recent_teams ORDER BY player_id, slot",
+              "SELECT * FROM character_recent_results ORDER BY character_id, slot",
+              "SELECT player_id, elo_good, elo_evil FROM players ORDER BY player_id",
+              "SELECT * FROM rating_snapshots ORDER BY player_id, game_id"]
+    same = all(db_setup.get_connection(paths["per_game"]).execute(query).fetchall() ==
+               db_setup.get_connection(paths["bulk"]).execute(query).fetchall() for query in checks)
+    db_setup.close_connections()
+    shutil.rmtree(folder)
+    print(f"{'games':>8}{'per-game (ms)':>15}{'bulk (ms)':>11}{'skipped':>9}{'same history':>14}")
+    print(f"{len(games):>8}{per_game * 1000:>15.1f}{bulk * 1000:>11.1f}{summary['skipped']:>9}{str(same):>14}")
+
+
+## The menus' original autocorrect: rapidfuzz over a freshly queried list of names
+def _correct_spelling(input_str, valid_entries, threshold=10):
+    from rapidfuzz import process
+
+    match = process.extractOne(input_str, valid_entries, score_cutoff=threshold)
+    return match[0] if match else None
+
+
+## Typed-name checks and autocorrect: a query per name (as the menus used to do) against name_index
+def bench_names(num_players=500, lookups=2_000):
+    import db_setup
+    import name_index
+    from synthetic_db import build_synthetic_db
+
+    db_setup.db_path = build_synthetic_db(1_000, num_players)
+    con = db_setup.get_connection()
+    names = [name for (name,) in con.execute("SELECT name FROM players")]
+    typed = [names[k % len(names)].lower() for k in range(lookups)]
+    script_id = con.execute("SELECT script_id FROM script_characters GROUP BY script_id ORDER BY COUNT(*) DESC").fetchone()[0]
+    misspelt = [name[:-1] for name in name_index.script_character_names(script_id)] * (lookups // 100)
+
+    start = time.perf_counter()
+    for name in typed:
+        con.execute("SELECT * FROM players WHERE name = ?", (name.capitalize(),)).fetchall()
+    query_lookup = time.perf_counter() - start
+    start = time.perf_counter()
+    for name in typed:
+        name_index.player_id(name)
+    index_lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fresh = []
+    for name in misspelt:
+        valid = [row[0] for row in con.execute("""
+        SELECT name FROM characters JOIN script_characters USING (character_id) WHERE script_id = ?
+        """, (script_id,))]
+        fresh.append(_correct_spelling(name, valid, threshold=60))
+    query_suggest = time.perf_counter() - start
+    start = time.perf_counter()
+    prebuilt = [name_index.suggest('characters', name, script_id) for name in misspelt]
+    index_suggest = time.perf_counter() - start
+
+    found = all(name_index.player_id(name) is not None for name in typed)
+    print(f"{'check':<14}{'calls':>7}{'query (us)':>12}{'index (us)':>12}{'same':>6}")
+    print(f"{'player name':<14}{len(typed):>7}{query_lookup / len(typed) * 1e6:>12.1f}"
+          f"{index_lookup / len(typed) * 1e6:>12.1f}{str(found):>6}")
+    print(f"{'autocorrect':<14}{len(misspelt):>7}{query_suggest / len(misspelt) * 1e6:>12.1f}"
+          f"{index_suggest / len(misspelt) * 1e6:>12.1f}{str(fresh == prebuilt):>6}")
+
+
+# ----------------------------
+# Outcome simulation
+# ----------------------------
+## Exact good-win rate of the simulator's game model, by enumerating every (came through / didn't) outcome
+def _exact_good_win_rate(win_probability, good):
+    import itertools
+    import numpy as np
+
+    outcomes = np.array(list(itertools.product([False, True], repeat=len(win_probability))))
+    probability = np.where(outcomes, win_probability, 1 - win_probability).prod(axis=1)
+    margin = outcomes @ np.where(good, 1 / good.sum(), -1 / (~good).sum())
+    return probability[margin >= 1e-9].sum() + 0.5 * probability[np.abs(margin) < 1e-9].sum()
+
+
+def bench_simulate(repeats=5):
+    import numpy as np
+    import pandas as pd
+    import simulation
+
+    print(f"{'players':>8}{'draws':>10}{'time (ms)':>11}{'estimate':>10}{'95% CI':>17}{'exact':>9}{'covered':>9}")
+    rng = np.random.default_rng(0)
+    for num_players in (7, 10, 15):
+        good = np.arange(num_players) >= num_players // 3
+        assignment = pd.DataFrame({'win_probability': rng.uniform(0.35, 0.65, num_players),
+                                   'team': np.where(good, 'Good', 'Evil')})
+        exact = _exact_good_win_rate(assignment['win_probability'].to_numpy(), good)
+        for draws in (100_000, 1_000_000):
+            best, _ = _time_runs(lambda: simulation.simulate_outcomes(assignment, draws, seed=1), repeats)
+            report = simulation.simulate_outcomes(assignment, draws, seed=1)
+            interval = f"{report['low']:.4f}-{report['high']:.4f}"
+            covered = report['low'] <= exact <= report['high']
+            print(f"{num_players:>8}{draws:>10}{best * 1000:>11.1f}{report['good_win_rate']:>10.4f}{interval:>17}"
+                  f"{exact:>9.4f}{str(covered):>9}")
+
+
+# ----------------------------
+# Registry
+# ----------------------------
+benchmarks = {
+    "cold_start": bench_cold_start,
+    "recent_history": bench_recent_history,
+    "feature_prep": bench_feature_prep,
+    "model_build": bench_model_build,
+    "two_stage": bench_two_stage,
+    "generate": bench_generate,
+    "elo": bench_elo,
+    "replay": bench_replay,
+    "strength": bench_strength,
+    "import": bench_import,
+    "names": bench_names,
+    "simulate": bench_simulate,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or list(benchmarks):
+        print(f"\n=== {name} ===")
+        benchmarks[name]()
@@ -0,0 +1,259 @@
+## BULK IMPORT ##
+# Imports a file of past games (e.g. a season exported from a spreadsheet) in one go instead of through
+# dataCollection's prompts. The file is read a row at a time, every name is checked against name_index's
+# in-memory tables, the games and assignments are inserted with executemany in chunked transactions,
+# and the aggregates, Elo ratings and character strengths are brought up to date once at the end.
+#
+# CSV files have one row per player with the columns
+#     game, script, winning_team, players_alive, player, character, team, assigned_by
+# where game is any key that groups a game's rows (they must be next to each other). players_alive,
+# team (defaults to the character's alignment) and assigned_by (defaults to manual) may be left blank,
+# and a blank or "x" script is an unknown script, as in dataCollection. JSON (a list) and JSONL (one
+# record per line) files take the same rows as objects, or one object per game with its players in an
+# "assignments" list.
+import os
+import csv
+import sys
+import json
+import time
+import itertools
+import db_setup
+import elo
+import name_index
+from aggregates import rebuild_aggregates
+from post_game_data_collection import update_character_strengths
+
+# Games inserted per transaction
+CHUNK_GAMES = 1000
+
+GAME_FIELDS = ['script', 'winning_team', 'players_alive']
+
+# Key read_rows puts the problem under for a record it couldn't read
+PARSE_ERROR = "_parse_error"
+
+
+## Reads the file one record at a time as (record number, row dict), expanding per-game JSON objects
+def read_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            # Row 1 is the header
+            yield from enumerate(csv.DictReader(handle), start=2)
+        return
+
+    if extension == ".jsonl":
+        with open(path, encoding="utf-8") as handle:
+            records = ((number, _parse_line(number, line)) for number, line in enumerate(handle, start=1) if line.strip())
+            yield from _expand_games(records)
+    elif extension == ".json":
+        with open(path, encoding="utf-8") as handle:
+            yield from _expand_games(enumerate(json.load(handle), start=1))
+    else:
+        raise ValueError(f"Can't import {extension or 'files without an extension'}; use .csv, .json or .jsonl")
+
+
+## A record that can't be read stands in as a game of its own, so it is skipped and reported like any
+## other bad game instead of ending the import
+def _unreadable(number, problem):
+    return {'game': f"record {number}", PARSE_ERROR: problem}
+
+
+def _parse_line(number, line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _unreadable(number, f"not valid JSON ({e})")
+
+
+def _expand_games(records):
+    for number, record in records:
+        if not isinstance(record, dict):
+            yield number, _unreadable(number, f"expected an object, not {type(record).__name__}")
+            continue
+        if "assignments" not in record:
+            yield number, record
+            continue
+        game = {field: value for field, value in record.items() if field != "assignments"}
+        game.setdefault("game", f"record {number}")
+        if not isinstance(record["assignments"], list) or not all(isinstance(row, dict) for row in record["assignments"]):
+            yield number, {**game, PARSE_ERROR: "assignments must be a list of objects"}
+            continue
+        for assignment in record["assignments"]:
+            yield number, {**game, **assignment}
+
+
+## Suggestion for a misspelt name, if one is close
+def _did_you_mean(kind, name, script_id=None):
+    match = name_index.suggest(kind, name, script_id, threshold=80)
+    return f" (did you mean {match}?)" if match else ""
+
+
+## Checks one game's rows. Returns (game row, assignment rows) with ids in place of names and the list of
+## problems found; the game is only imported if there are none.
+def validate_game(rows):
+    errors = [f"record {number}: {row[PARSE_ERROR]}" for number, row in rows if PARSE_ERROR in row]
+    if errors:
+        return None, [], errors
+    number, first = rows[0]
+
+    script = name_index.script_key(first.get('script') or "")
+    if script in ("", "X"):
+        script_id = None
+    elif name_index.script(script) is not None:
+        script_id = name_index.script(script)[0]
+    else:
+        script_id = None
+        errors.append(f"record {number}: no script named {script}{_did_you_mean('scripts', script)}")
+
+    winning_team = str(first.get('winning_team') or "").strip().capitalize()
+    if winning_team not in ("Good", "Evil"):
+        errors.append(f"record {number}: winning team must be good or evil, not '{winning_team}'")
+
+    players_alive = first.get('players_alive')
+    players_alive = None if players_alive in (None, "") else int(players_alive)
+
+    assignments = []
+    seen_players = set()
+    for number, row in rows:
+        for field in GAME_FIELDS:
+            if str(row.get(field) or "") != str(first.get(field) or ""):
+                errors.append(f"record {number}: {field} differs from the game's first row")
+
+        player = name_index.player_key(row.get('player') or "")
+        player_id = name_index.player_id(player)
+        if player_id is None:
+            errors.append(f"record {number}: no player named '{player}'{_did_you_mean('players', player)}")
+        elif player_id in seen_players:
+            errors.append(f"record {number}: {player} is in this game twice")
+        seen_players.add(player_id)
+
+        character = name_index.character_key(row.get('character') or "")
+        if name_index.character(character) is None:
+            errors.append(f"record {number}: no character named '{character}'{_did_you_mean('characters', character, script_id)}")
+            continue
+        character_id, alignment, _ = name_index.character(character)
+        if script_id is not None and not name_index.in_script(script_id, character_id):
+            errors.append(f"record {number}: the {character} is not in {script}")
+
+        team = str(row.get('team') or alignment).strip().capitalize()
+        if team not in ("Good", "Evil"):
+            errors.append(f"record {number}: team must be good or evil, not '{team}'")
+
+        assigned_by = str(row.get('assigned_by') or "manual").strip().lower()
+        if assigned_by not in ("manual", "model"):
+            errors.append(f"record {number}: assigned by must be manual or model, not '{assigned_by}'")
+
+        assignments.append((player_id, character_id, team, int(team == winning_team), assigned_by))
+
+    return (script_id, winning_team, len(rows), players_alive), assignments, errors
+
+
+## Inserts one chunk of validated games with explicit game ids, in one transaction
+def _insert_chunk(con, games):
+    cur = con.cursor()
+    try:
+        cur.executemany("""
+        INSERT INTO games (game_id, script_id, winning_team, player_count, players_alive)
+        VALUES(?, ?, ?, ?, ?);
+        """, [(game_id,) + game for game_id, game, _ in games])
+        cur.executemany("""
+        INSERT INTO assignments (game_id, player_id, character_id, team, won, assigned_by)
+        VALUES(?, ?, ?, ?, ?, ?);
+        """, [(game_id,) + assignment for game_id, _, assignments in games for assignment in assignments])
+        con.commit()
+        return True
+    except Exception as e:
+        print(f"Import failed: {e}")
+        con.rollback()
+        return False
+
+
+## Imports every valid game in a file, skipping (and reporting) any game with a problem. With dry_run
+## the file is only checked. Returns a summary dict.
+def import_results(path, dry_run=False, chunk_games=CHUNK_GAMES):
+    start = time.perf_counter()
+    con = db_setup.get_connection()
+    cur = con.cursor()
+    cur.execute("SELECT COALESCE(MAX(game_id), 0) FROM games;")
+    first_game_id = next_game_id = cur.fetchone()[0] + 1
+
+    summary = {'games': 0, 'assignments': 0, 'skipped': 0, 'errors': []}
+    seen_games = set()
+    chunk = []
+    failed = False
+    try:
+        for game, rows in itertools.groupby(read_rows(path), key=lambda record: str(record[1].get('game', ""))):
+            rows = list(rows)
+            try:
+                game_row, assignments, errors = validate_game(rows)
+            except (ValueError, TypeError) as e:
+                game_row, assignments, errors = None, [], [f"record {rows[0][0]}: {e}"]
+            if game in seen_games:
+                errors.append(f"record {rows[0][0]}: rows for game {game} are not next to each other")
+            seen_games.add(game)
+
+            if errors:
+                summary['skipped'] += 1
+                summary['errors'] += [f"Game {game}, {error}" for error in errors]
+                continue
+
+            chunk.append((next_game_id, game_row, assignments))
+            next_game_id += 1
+            summary['games'] += 1
+            summary['assignments'] += len(assignments)
+            if len(chunk) == chunk_games and not dry_run:
+                failed = not _insert_chunk(con, chunk)
+                chunk = []
+                if failed:
+                    break
+        if chunk and not dry_run and not failed:
+            failed = not _insert_chunk(con, chunk)
+    except (OSError, ValueError, csv.Error) as e:
+        # The rest of the file can't be read (e.g. a .json file that isn't valid JSON); games in chunks
+        # already committed stay imported
+        summary['errors'].append(f"Import stopped, {path} could not be read: {e}")
+        failed = True
+    finally:
+        cur.execute("SELECT COALESCE(MAX(game_id), 0) FROM games;")
+        last_game_id = cur.fetchone()[0]
+        # One pass over the new history for everything that dataCollection updates game by game. The
+        # strengths get a single update per character from its latest results rather than one per game.
+        # This runs whenever a chunk was committed, however the import ended.
+        if not dry_run and last_game_id >= first_game_id:
+            rebuild_aggregates(con)
+            elo.rate_new_games(first_game_id)
+            update_character_strengths(first_game_id, last_game_id=last_game_id)
+
+    for error in summary['errors']:
+        print(error)
+
+    # Games from the failed chunk on weren't inserted
+    if failed and not dry_run:
+        summary['games'] = max(last_game_id - first_game_id + 1, 0)
+        cur.execute("SELECT COUNT(*) FROM assignments WHERE game_id >= ?;", (first_game_id,))
+        summary['assignments'] = cur.fetchone()[0]
+
+    summary['seconds'] = time.perf_counter() - start
+    action = "Checked" if dry_run else "Imported"
+    print(f"{action} {summary['games']} games ({summary['assignments']} players), skipped {summary['skipped']} "
+          f"in {summary['seconds']:.1f}s")
+    return summary
+
+
+## Menu entry point
+def importResults():
+    path = str(input("Enter the path of the results file (.csv/.json/.jsonl):   ")).strip().strip('"')
+    if not os.path.exists(path):
+        print("No file at", path)
+        return
+    check = str(input("Check the file without importing it?   ")).lower()
+    import_results(path, dry_run=check in ("y", "yes"))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    if dry_run:
+        args.remove("--dry-run")
+    for path in args:
+        import_results(path, dry_run)
@@ -1,18 +1,198 @@
 ## MATRIX CALCULATIONS ##
 import numpy as np
 import pandas as pd
-import pymc as pm
-from pulp import LpProblem, LpVariable, LpMinimize, lpSum, LpBinary, value
-import sqlite3
+from pulp import value, LpAffineExpression
 import math
-import random
+from dataclasses import dataclass, field
 import db_setup
-from character_constraints import character_constraints
+from model_fit import get_model_fit, FIT_BACKEND
+import solver
+import formulation
+import two_stage
+import character_constraints
+import script_bundles
+import simulation
+import elo
+
+# Toggle between the vectorised S/B builder and the original per-cell loop (kept for parity checks)
+VECTORISED_SCORES = True
+
+# "milp" solves character choice and seating in one MILP; "two_stage" picks the characters first,
+# then seats the players with a linear assignment solve (see two_stage.py)
+ENGINE = "milp"
+
+# --- Normalisation helpers ---
+def normaliseElo(elo): return (elo - 1500) / 400
+def normaliseBaseStrength(bs): return (bs - 50) / 25
+
+
+## The fitted model's chance of a win (no selection jitter) for a rating and base strength; works on arrays
+def fitted_win_probability(elo, base_strength, weights):
+    weighted_elo, weighted_strength, intercept = weights
+    logit = weighted_elo * normaliseElo(elo) + weighted_strength * normaliseBaseStrength(base_strength) + intercept
+    return 1 / (1 + np.exp(-logit))
+
+
+## Alignment bias for a single player from their recent team history (most recent first)
+def get_alignment_bias(history, target_alignment, noise=True, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    if target_alignment == 'Good':
+        recent_evil = history[:2].count('Evil')
+        consecutive_evil = 0
+        for align in history:
+            if align == 'Evil': consecutive_evil += 1
+            else: break
+        base = 0.5 + 0.3 * recent_evil + 0.2 * consecutive_evil
+        jitter = rng.uniform(-1.5, 1.5) if noise else 0.0
+        return round(base + jitter, 3)
+    else:
+        good_streak = 0
+        for align in history:
+            if align == 'Good': good_streak += 1
+            else: break
+        decay = 1 / (1 + math.exp(1.2 * (good_streak - 3)))
+        jitter = rng.uniform(0.3, 1.0) if noise else 0.65
+        base = 0.3 + decay * jitter
+        return round(base + (rng.uniform(0.05, 0.2) if noise else 0.125), 3)
+
+
+## Original S/B builder: one np.exp / random draw / bias call per (player, character) cell
+def build_score_matrices_loop(players, characters, recent_history, weighted_elo, weighted_strength, intercept, rng=None, noise=True):
+    rng = np.random.default_rng() if rng is None else rng
+    num_players = len(players)
+    num_characters = len(characters)
+    S = np.zeros((num_players, num_characters))
+    B = np.zeros((num_players, num_characters))
+    for i, player in players.iterrows():
+        for j, character in characters.iterrows():
+            elo = player['elo_good'] if character['alignment'] == 'Good' else player['elo_evil']
+            norm_elo = (elo - 1500) / 400
+            norm_strength = (character['base_strength'] - 50) / 25
+            logit = weighted_elo * norm_elo + weighted_strength * norm_strength + intercept
+            win_prob = 1 / (1 + np.exp(-logit))
+            jitter = rng.uniform(-0.02, 0.02) if noise else 0.0
+            if character['role_type'] == 'Minion' and noise:
+                jitter += rng.uniform(-0.05, 0.05)  # extra jitter to vary minion selections
+            S[i][j] = np.clip(win_prob + jitter, 0.0, 1.0)
+            B[i][j] = get_alignment_bias(recent_history.get(player['player_id'], []), character['alignment'], noise, rng)
+    return S, B
+
+
+## Vectorised S/B builder: same distributions as the loop, with all jitter drawn in one batch from rng
+def build_score_matrices(players, characters, recent_history, weighted_elo, weighted_strength, intercept, rng=None, noise=True):
+    if rng is None:
+        rng = np.random.default_rng()
+    num_players = len(players)
+    num_characters = len(characters)
+
+    # Per-character arrays
+    is_good = (characters['alignment'].values == 'Good')
+    is_minion = (characters['role_type'].values == 'Minion')
+    base_strength = characters['base_strength'].values.astype(float)
+
+    # Per-player arrays
+    elo = np.where(is_good[None, :],
+                   players['elo_good'].values.astype(float)[:, None],
+                   players['elo_evil'].values.astype(float)[:, None])
+    win_prob = fitted_win_probability(elo, base_strength[None, :], (weighted_elo, weighted_strength, intercept))
+
+    # Recent history features, one pass per player
+    recent_evil = np.zeros(num_players)
+    consecutive_evil = np.zeros(num_players)
+    good_streak = np.zeros(num_players)
+    for i, player_id in enumerate(players['player_id'].values):
+        history = recent_history.get(player_id, [])
+        recent_evil[i] = history[:2].count('Evil')
+        for align in history:
+            if align != 'Evil': break
+            consecutive_evil[i] += 1
+        for align in history:
+            if align != 'Good': break
+            good_streak[i] += 1
+    good_base = 0.5 + 0.3 * recent_evil + 0.2 * consecutive_evil
+    evil_decay = 1 / (1 + np.exp(1.2 * (good_streak - 3)))
+
+    shape = (num_players, num_characters)
+    if noise:
+        jitter = rng.uniform(-0.02, 0.02, size=shape)
+        jitter += np.where(is_minion[None, :], rng.uniform(-0.05, 0.05, size=shape), 0.0)  # extra jitter to vary minion selections
+        good_noise = rng.uniform(-1.5, 1.5, size=shape)
+        evil_noise = rng.uniform(0.3, 1.0, size=shape)
+        evil_offset = rng.uniform(0.05, 0.2, size=shape)
+    else:
+        jitter = np.zeros(shape)
+        good_noise = np.zeros(shape)
+        evil_noise = np.full(shape, 0.65)
+        evil_offset = np.full(shape, 0.125)
+
+    S = np.clip(win_prob + jitter, 0.0, 1.0)
+    good_bias = good_base[:, None] + good_noise
+    evil_bias = 0.3 + evil_decay[:, None] * evil_noise + evil_offset
+    B = np.round(np.where(is_good[None, :], good_bias, evil_bias), 3)
+    return S, B
+
+
+## Adds the normalised elo/strength feature columns to game_data via id -> position lookups
+def add_model_features(game_data, players, characters):
+    player_pos = pd.Index(players['player_id']).get_indexer(game_data['player_id'])
+    is_good = game_data['alignment'].values == 'Good'
+    elo = np.where(is_good,
+                   np.take(players['elo_good'].values, player_pos),
+                   np.take(players['elo_evil'].values, player_pos))
+    game_data['normalized_elo'] = normaliseElo(elo.astype(float))
+
+    # Village Idiot clones share an id with the original, so keep one row per character
+    unique_chars = characters.drop_duplicates('character_id')
+    char_pos = pd.Index(unique_chars['character_id']).get_indexer(game_data['character_id'])
+    game_data['normalized_strength'] = normaliseBaseStrength(np.take(unique_chars['base_strength'].values, char_pos).astype(float))
+    return game_data
+
+
+## Last `limit` teams for every player in one query (most recent first); players with no history default to Good
+def fetch_recent_history(cur, player_ids, limit=db_setup.AGGREGATE_WINDOW, as_of_game=None):
+    # player_recent_teams is a per-player ring buffer of the last AGGREGATE_WINDOW teams,
+    # so this reads at most that many rows per player whatever the size of the history
+    query = """
+    SELECT player_id, team,
+           ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY assignment_id DESC) AS recency
+    FROM player_recent_teams
+    WHERE player_id IN ({});
+    """.format(','.join(['?'] * len(player_ids)))
+    params = tuple(player_ids)
+    # The ring buffer only holds the latest teams, so a back-test reads the history up to its game instead
+    if as_of_game is not None:
+        query = """
+        SELECT player_id, team,
+               ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY assignment_id DESC) AS recency
+        FROM assignments
+        WHERE player_id IN ({}) AND game_id <= ?;
+        """.format(','.join(['?'] * len(player_ids)))
+        params += (as_of_game,)
+    cur.execute(query, params)
+
+    # Slot each row by its recency rather than paying for an ORDER BY sort
+    fetched = {}
+    for player_id, team, recency in cur.fetchall():
+        if recency <= limit:
+            fetched.setdefault(player_id, [None] * limit)[recency - 1] = team
+
+    recent_history = {}
+    for player_id in player_ids:
+        if player_id in fetched:
+            recent_history[player_id] = [team for team in fetched[player_id] if team is not None]
+        else:
+            recent_history[player_id] = ['Good'] * limit
+    return recent_history
+
 
-def assignments(script_name, player_list):
+## Loads everything a game set-up needs from the database: the seated players, the script's characters,
+## recent team history, the base role requirements and the fitted model weights. With as_of_game the
+## players' ratings, recent teams and the outcomes the model is fitted on only cover the games up to that
+## one (character strengths have no history, so they are the current ones).
+def load_problem(script_name, player_list, fit_backend=FIT_BACKEND, as_of_game=None):
     # Connect to db
     try:
-        con = sqlite3.connect(db_setup.db_path)
+        con = db_setup.get_connection()
         cur = con.cursor()
     except Exception as e:
         print(f'An error occurred: {e}.')
@@ -26,6 +206,9 @@ def assignments(script_name, player_list):
 
     cur.execute(query, tuple(player_list))
     rows = cur.fetchall() 
+    # The index on name returns players sorted by name; the rules need them in the order they sit in
+    seats = {name: seat for seat, name in enumerate(player_list)}
+    rows.sort(key=lambda row: seats[row[1]])
 
     # Convert output into lists
     a, b, c, d = zip(*rows)
@@ -45,67 +228,55 @@ def assignments(script_name, player_list):
 
 
 
-    # Get players recent team history
-    recent_history = {}
-    for player in player_ids:
-        query = """
-        SELECT player_id, team 
-        FROM assignments
-        WHERE player_id = ?
-        ORDER BY assignment_id DESC
-        LIMIT 10;
-        """
-        cur.execute(query, (player,))
-        rows = cur.fetchall()
+    # Ratings as they stood after an earlier game instead of the current ones (for back-testing set-ups)
+    if as_of_game is not None:
         try:
-            a, b = zip(*rows)
-            team_for_player = list(b)
-        except:
-            team_for_player = ['Good', 'Good', 'Good', 'Good', 'Good', 'Good', 'Good', 'Good', 'Good', 'Good']
-        recent_history[player] = team_for_player
+            ratings = elo.ratings_as_of(cur, player_ids, as_of_game)
+        except ValueError as e:
+            print(e)
+            return
+        players['elo_good'] = [ratings[player_id][0] for player_id in player_ids]
+        players['elo_evil'] = [ratings[player_id][1] for player_id in player_ids]
 
+    # Get players recent team history
+    recent_history = fetch_recent_history(cur, player_ids, as_of_game=as_of_game)
 
 
-    sql = """
-    SELECT character_id, name, alignment, role_type, base_strength
-    FROM characters RIGHT JOIN script_characters USING (character_id)
-    WHERE script_id = (
-    SELECT script_id
-    FROM scripts
-    WHERE scripts.name = ?);
-    """
-    cur.execute(sql, (script_name,))
-    rows = cur.fetchall()
-    a, b, c, d, e = zip(*rows)
-    char_ids = list(a)
-    char_names = list(b)
-    char_alignments = list(c)
-    char_types = list(d)
-    char_strengths = list(e)
-
-
-    # Set up characters dataframe
-    characters = pd.DataFrame({
-        'character_id': char_ids,
-        'name': char_names,
-        'alignment': char_alignments,
-        'base_strength': char_strengths,
-        'role_type': char_types
-    }).sample(frac=1).reset_index(drop=True)  # shuffle to break deterministic ties
 
+    # Script characters (with extra copies such as Village Idiot 2 and 3), from the script's bundle
+    characters = script_bundles.load_characters(cur, script_name)
+    if characters is None:
+        print(f"No script named {script_name}")
+        return
+    char_ids = characters['character_id'].drop_duplicates().tolist()
+
+    # Outcome counts per (player, character, team), from the aggregate tables
     query = """
-    SELECT player_id, character_id, team, won
-    FROM assignments
+    SELECT player_id, character_id, team, games, wins
+    FROM player_character_stats
     WHERE player_id IN ({})
     AND character_id IN ({})""".format(','.join(['?'] * len(player_ids)),
                                        ','.join(['?'] * len(char_ids)))
-    cur.execute(query, tuple(player_ids + char_ids))
+    params = tuple(player_ids + char_ids)
+    # The aggregates include every game, so a back-test counts the games up to its own from the history
+    if as_of_game is not None:
+        query = """
+        SELECT player_id, character_id, team, COUNT(*), SUM(won)
+        FROM assignments
+        WHERE player_id IN ({})
+        AND character_id IN ({})
+        AND game_id <= ?
+        GROUP BY player_id, character_id, team""".format(','.join(['?'] * len(player_ids)),
+                                                         ','.join(['?'] * len(char_ids)))
+        params += (as_of_game,)
+    cur.execute(query, params)
     rows = cur.fetchall()
-    a, b, c, d = zip(*rows)
+    a, b, c, d, e = zip(*rows)
     player_ids_assign = list(a)
     char_ids_assign = list(b)
     team_assign = list(c)
-    won_assign = list(d)
+    games_assign = list(d)
+    won_assign = list(e)
 
 
     query = """
@@ -116,63 +287,19 @@ def assignments(script_name, player_list):
     num_players = len(player_list)
     cur.execute(query, (num_players,))
     num_types = cur.fetchall()
-    con.close()
 
     # Set up previous game data outcomes
     game_data = pd.DataFrame({
         'player_id': player_ids_assign,
         'character_id': char_ids_assign,
         'alignment': team_assign,
+        'games': games_assign,
         'won': won_assign
     })
 
 
-    # Suppose you already have your characters dataframe
-    # Find the Village Idiot row
-    vi_row = characters[characters['name'] == 'Village Idiot']
 
-    # Duplicate it up to 3 times (with unique indices)
-    for k in range(2, 4):  # add VI_2 and VI_3
-        new_row = vi_row.copy()
-        new_row['name'] = f"Village Idiot {k}"   # give them unique names
-        characters = pd.concat([characters, new_row], ignore_index=True)
-    # --- Normalisation helpers ---
-    def normaliseElo(elo): return (elo - 1500) / 400
-    def normaliseBaseStrength(bs): return (bs - 50) / 25
-
-    def getNormalisedElo(row):
-        player = players.loc[players['player_id'] == row['player_id']].iloc[0]
-        return normaliseElo(player['elo_good'] if row['alignment'] == 'Good' else player['elo_evil'])
-
-    game_data['normalized_elo'] = game_data.apply(getNormalisedElo, axis=1)
-
-    def getNormalisedStrength(cid):
-        strength = characters.loc[characters['character_id'] == cid, 'base_strength'].values[0]
-        return normaliseBaseStrength(strength)
-
-    # --- Alignment bias from history ---
-    def get_alignment_bias(player_id, target_alignment):
-        history = recent_history.get(player_id, [])
-        if target_alignment == 'Good':
-            recent_evil = history[:2].count('Evil')
-            consecutive_evil = 0
-            for align in history:
-                if align == 'Evil': consecutive_evil += 1
-                else: break
-            base = 0.5 + 0.3 * recent_evil + 0.2 * consecutive_evil
-            noise = random.uniform(-1.5, 1.5)
-            return round(base + noise, 3)
-        else:
-            good_streak = 0
-            for align in history:
-                if align == 'Good': good_streak += 1
-                else: break
-            decay = 1 / (1 + math.exp(1.2 * (good_streak - 3)))
-            noise = random.uniform(0.3, 1.0)
-            base = 0.3 + decay * noise
-            return round(base + random.uniform(0.05, 0.2), 3)
-
-    game_data['normalized_strength'] = game_data['character_id'].map(getNormalisedStrength)
+    add_model_features(game_data, players, characters)
 
     # --- Base requirements from table ---
     player_requirements = {
@@ -182,217 +309,373 @@ def assignments(script_name, player_list):
         'Demon':     num_types[0][4],
     }
 
-    # --- Build model ---
-    accept = False
-    while not accept:
-        if 'forced_evil' not in characters.columns:
-            characters['forced_evil'] = False
-        else:
-            characters['forced_evil'] = False
-
-        # Fit logistic model
-        with pm.Model() as model:
-            weighted_elo = pm.Normal('weighted_elo', mu=1, sigma=3)
-            weighted_strength = pm.Normal('weighted_strength', mu=1, sigma=3)
-            intercept = pm.Normal('intercept', mu=0, sigma=1)
-
-            theta = pm.Data('theta', game_data['normalized_elo'].values)
-            phi   = pm.Data('phi',   game_data['normalized_strength'].values)
-
-            logits = (weighted_elo * theta) + (weighted_strength * phi) + intercept
-            p = pm.Deterministic('p', pm.math.sigmoid(logits))
-            pm.Bernoulli('outcome', p=p, observed=game_data['won'].values)
-
-            map_estimate = pm.find_MAP()
-
-        weighted_elo = map_estimate['weighted_elo']
-        weighted_strength = map_estimate['weighted_strength']
-        intercept = map_estimate['intercept']
-
-        num_players = len(players)
-        num_characters = len(characters)
-
-        prob = LpProblem("CharacterAssignment", LpMinimize)
-        x = [[LpVariable(f"x_{i}_{j}", cat=LpBinary) for j in range(num_characters)] for i in range(num_players)]
-
-        # Each player gets exactly one character
-        for i in range(num_players):
-            prob += lpSum(x[i][j] for j in range(num_characters)) == 1
-
-        # Each character to at most one player
-        for j in range(num_characters):
-            prob += lpSum(x[i][j] for i in range(num_players)) <= 1
-
-        # Apply character-specific constraints and collect adjusted requirements
-        adjusted_requirements = dict(player_requirements)
-        hooks = []
-        logging_results = []
-
-
-        for char_name, fn in character_constraints.items():
-            if char_name in characters['name'].values:
-                char_index = characters[characters['name'] == char_name].index[0]
-                result = fn(prob, x, characters, players, player_requirements, char_index)
-
-                if "_log" in result:
-                    print(f"[Constraint Applied] {result['_log']}")
-                    logging_results.append({result['_log']})
-                if "_hook" in result:
-                    hooks.append(result["_hook"])
-
-                # Remove logs/hooks so only deltas remain
-                result.pop("_log", None)
-                result.pop("_hook", None)
-
-                # *** Accumulate deltas ***
-                for role_type, delta in result.items():
-                    adjusted_requirements[role_type] = adjusted_requirements.get(role_type, 0) + delta
-
-        # --- Summoner special case ---
-        if "Summoner" in characters['name'].values:
-            summoner_index = characters[characters['name'] == "Summoner"].index[0]
-            summoner_in_play = lpSum(x[i][summoner_index] for i in range(num_players))
-            adjusted_requirements["Demon"] = player_requirements['Demon'] - summoner_in_play
-            adjusted_requirements["Townsfolk"] = player_requirements['Townsfolk'] + summoner_in_play
-            print("[Constraint Applied] Summoner → Demons -1, Townsfolk +1")
-
-        # Run hooks before building S/B
-        for hook in hooks:
-            msg = hook(characters, players)
-            print(f"[Balance Adjustment] {msg}")
-
-        # Build S and B
-        S = np.zeros((num_players, num_characters))
-        B = np.zeros((num_players, num_characters))
-        for i, player in players.iterrows():
-            for j, character in characters.iterrows():
-                elo = player['elo_good'] if character['alignment'] == 'Good' else player['elo_evil']
-                norm_elo = (elo - 1500) / 400
-                norm_strength = (character['base_strength'] - 50) / 25
-                logit = weighted_elo * norm_elo + weighted_strength * norm_strength + intercept
-                win_prob = 1 / (1 + np.exp(-logit))
-                jitter = np.random.uniform(-0.02, 0.02)
-                if character['role_type'] == 'Minion':
-                    jitter += np.random.uniform(-0.05, 0.05)  # extra jitter to vary minion selections
-                S[i][j] = np.clip(win_prob + jitter, 0.0, 1.0)
-                B[i][j] = get_alignment_bias(player['player_id'], character['alignment'])
-
-        # Enforce adjusted role requirements (CRITICAL: no per-character usage caps)
-        for role_type in ['Townsfolk', 'Outsider', 'Minion', 'Demon']:
-            role_mask = [1 if characters.loc[j, 'role_type'] == role_type else 0 for j in range(num_characters)]
-            role_count = lpSum(x[i][j] * role_mask[j] for i in range(num_players) for j in range(num_characters))
-            required_count = adjusted_requirements.get(role_type, player_requirements[role_type])
-            prob += role_count == required_count
-
-        # Team balance with tolerance
-        team_sign = [1 if characters.loc[j, 'alignment'] == 'Good' else -1 for j in range(num_characters)]
-        good_total = lpSum(x[i][j] * S[i][j] for i in range(num_players) for j in range(num_characters) if team_sign[j] == 1)
-        evil_total = lpSum(x[i][j] * S[i][j] for i in range(num_players) for j in range(num_characters) if team_sign[j] == -1)
-
-        num_good_chars = sum(1 for j in range(num_characters) if team_sign[j] == 1)
-        num_evil_chars = sum(1 for j in range(num_characters) if team_sign[j] == -1)
-
-        av_good = good_total / (num_good_chars if num_good_chars > 0 else 1)
-        av_evil = evil_total / (num_evil_chars if num_evil_chars > 0 else 1)
-
-        bias_score = lpSum(x[i][j] * B[i][j] for i in range(num_players) for j in range(num_characters))
-
-        tolerance = 1.0
-        excess = LpVariable("excess_imbalance", lowBound=0)
-        prob += av_good - av_evil <= tolerance + excess
-        prob += av_evil - av_good <= tolerance + excess
-
-        objective = excess - bias_score
-        if "Summoner" in characters['name'].values:
-            summoner_var = lpSum(x[i][summoner_index] for i in range(num_players))
-            num_demons  = (characters['role_type'] == 'Demon').sum()
-            print("NUMBER DEMONS =", num_demons)
-            summoner_buffer = ((num_demons + 1) / (num_demons*2)) 
-            print(summoner_buffer)
-            objective += summoner_buffer * summoner_var   # tune weight upwards if Summoner still too frequent
-        noise = lpSum(np.random.uniform(-0.05, 0.05) * x[i][j] for i in range(num_players) for j in range(num_characters))
-        objective += noise
-
-        prob += objective
-        if 'drunk' not in players.columns:
-                players['drunk'] = False
-        else:
-            players['drunk'] = False  # reset each run
-
-        # Solve
-        prob.solve()
-
-        # Run post-solve hooks (e.g. BH target resolution)
-        for hook in hooks:
-            msg = hook(characters, players)
-            print(f"[Post-Solve Adjustment] {msg}")
-
+    # Fit logistic model once; game_data does not change between rerolls
+    weights = get_model_fit(game_data, player_ids, char_ids, fit_backend, as_of_game)
 
-        # Diagnostics
-        print("Objective components:")
-        print("  Excess imbalance:", value(excess))
-        print("  Bias score:", value(bias_score))
-        # if "Baron" in characters['name'].values:
-        #     print("  Baron chosen:", value(baron_var))
-
-
-
-        # Build assignments
-        assigned = []
-        to_output = ""
-
-        for i in range(num_players):
-            for j in range(num_characters):
-                if x[i][j].value() == 1:
-                    team = characters.loc[j, 'alignment']
-
-                    if 'forced_evil' in characters.columns and characters.loc[j, 'forced_evil']:
-                        team = "Evil"
-                        to_output = characters.loc[j, 'name'] + " is evil because of the Bounty Hunter"
+    return {
+        'script': script_name,
+        'players': players,
+        'characters': characters,
+        'recent_history': recent_history,
+        'player_requirements': player_requirements,
+        'weights': weights,
+    }
 
-                    drunk_flag = bool(players.loc[i, 'drunk'])
 
-                    assigned.append({
-                        'player': players.loc[i, 'name'],
-                        'character': characters.loc[j, 'name'],
-                        'role_type': characters.loc[j, 'role_type'],
-                        'win_probability': float(np.clip(S[i][j], 0.0, 1.0)),
-                        'team': team,
-                        'drunk': "Drunk" if drunk_flag else "_"
-                    })
+## The outcome of one assignment solve; plain data, so it pickles across processes
+@dataclass
+class AssignmentResult:
+    assignment: pd.DataFrame      # player, character, role_type, win_probability, team, drunk
+    adjusted_requirements: dict   # role type -> number enforced in this solution
+    logs: list                    # the character rules applied
+    stats: dict                   # solver statistics (backend, status, objective, solve_time, nodes, gap)
+    excess: float = 0.0           # team imbalance beyond the tolerance
+    bias: float = 0.0             # alignment bias score of the chosen pairs
+    notes: str = ""               # e.g. the Bounty Hunter's forced-evil target
+    pairs: list = field(default_factory=list)     # chosen (player, character) index pairs, in this solve's column order
+    choices: list = field(default_factory=list)   # chosen (player_id, character name) pairs, which hold across shuffles
+    seed: int = None              # reproduces the result through generate_assignment
+    messages: list = field(default_factory=list)  # constraint, solver and hook messages, in order
+
+    @property
+    def solved(self):
+        return self.stats.get('status') == "Optimal"
+
+
+## Builds the model for one solve: the grid, character rules, role rows and the S/B/noise scores.
+## Messages go to log rather than stdout.
+def build_model(problem, rng, vectorised=VECTORISED_SCORES, engine=ENGINE, log=None):
+    log = [] if log is None else log
+    players = problem['players']
+    characters = problem['characters']
+    player_requirements = problem['player_requirements']
+    weighted_elo, weighted_strength, intercept = problem['weights']
+
+    # Name of the character that turned each character Evil ("" for none)
+    characters['forced_evil'] = ""
+
+    num_players = len(players)
+    num_characters = len(characters)
+
+    # The script's rules are parsed once per script and table size; rerolls reuse the compiled rules
+    compiled = character_constraints.compile_rules(characters, player_requirements)
+    pruned = formulation.prunable_columns(characters, compiled['role_limits'])
+    if engine == "two_stage":
+        prob, x = two_stage.create_selection_grid(num_players, num_characters)
+    else:
+        prob, x = formulation.create_grid(num_players, num_characters, pruned)
+        formulation.add_assignment_rows(prob, x)
+
+    # Character rules: adjusted requirements, option weights and post-solve hooks
+    rules = character_constraints.apply_rules(prob, x, characters, compiled, rng)
+    adjusted_requirements = rules['requirements']
+    hooks = rules['hooks']
+    logging_results = rules['logs']
+    for message in logging_results:
+        log.append(f"[Constraint Applied] {message}")
+
+    # Build S and B
+    if vectorised:
+        S, B = build_score_matrices(players, characters, problem['recent_history'],
+                                    weighted_elo, weighted_strength, intercept, rng)
+    else:
+        S, B = build_score_matrices_loop(players, characters, problem['recent_history'],
+                                         weighted_elo, weighted_strength, intercept, rng)
+
+    # Enforce adjusted role requirements (CRITICAL: no per-character usage caps)
+    roles, teams = formulation.column_groups(characters)
+    formulation.add_role_rows(prob, x, roles, adjusted_requirements, player_requirements)
+
+    # Team balance with tolerance, bias and noise in the objective
+    column_penalties = {}
+    if "Summoner" in characters['name'].values:
+        summoner_index = characters[characters['name'] == "Summoner"].index[0]
+        num_demons  = (characters['role_type'] == 'Demon').sum()
+        log.append(f"NUMBER DEMONS = {num_demons}")
+        summoner_buffer = ((num_demons + 1) / (num_demons*2)) 
+        log.append(str(summoner_buffer))
+        column_penalties[summoner_index] = summoner_buffer   # tune weight upwards if Summoner still too frequent
+    noise = rng.uniform(-0.05, 0.05, size=(num_players, num_characters))
+    if engine != "two_stage":
+        # Seats the rules turn Evil by where they sit (the two-stage matching can't see seats, so there
+        # they only show up in the reported excess)
+        balance_adjustment = LpAffineExpression()
+        for balance in rules['balance']:
+            balance_adjustment += balance(S, teams)
+        formulation.add_balance_and_objective(prob, x, S, B, noise, teams, column_penalties=column_penalties,
+                                              extra_objective=rules['objective'], balance_adjustment=balance_adjustment)
+
+    return {
+        'engine': engine,
+        'prob': prob,
+        'x': x,
+        'hooks': hooks,
+        'logs': logging_results,
+        'adjusted_requirements': adjusted_requirements,
+        'S': S,
+        'B': B,
+        'noise': noise,
+        'teams': teams,
+        'column_penalties': column_penalties,
+        'rule_objective': rules['objective'],
+    }
 
 
+## Solves a built model and logs the solver line. MILP rerolls are warm-started from the last rejected
+## assignment and cut off from every rejected one; the two-stage engine rerolls from fresh noise alone,
+## as its matching stage can't take the cuts.
+def solve_model(model, solver_settings=None, rejected=(), log=None):
+    log = [] if log is None else log
+    if model['engine'] == "two_stage":
+        stats = two_stage.solve(model['prob'], model['x'], model['S'], model['B'], model['noise'], model['teams'],
+                                column_penalties=model['column_penalties'], settings=solver_settings,
+                                extra_objective=model['rule_objective'])
+    else:
+        if rejected:
+            solver.warm_start(model['prob'], model['x'], rejected)
+        stats = solver.solve(model['prob'], solver_settings)
+    gap = "n/a" if stats['gap'] is None else f"{stats['gap']:.2%}"
+    log.append(f"[Solver] {stats['backend']}: {stats['status']} in {stats['solve_time']:.2f}s, "
+               f"nodes={stats['nodes']}, gap={gap}")
+    return stats
+
+
+## Runs the post-solve hooks on a solved model and reads it into an AssignmentResult.
+## The hooks mark drunk players and forced-evil targets, so they run on copies of the problem's frames.
+def summarise_solution(model, problem, stats, seed=None, log=None):
+    log = [] if log is None else log
+    x, S, B = model['x'], model['S'], model['B']
+    players = problem['players'].copy()
+    characters = problem['characters'].copy()
+    players['drunk'] = False  # reset each run
+
+    # Run post-solve hooks (e.g. BH target resolution)
+    for hook in model['hooks']:
+        msg = hook(characters, players)
+        log.append(f"[Post-Solve Adjustment] {msg}")
+
+    chosen = solver.chosen_pairs(x)
+
+    # Build assignments
+    assigned = []
+    notes = []
+    turned_evil = []
+
+    for i, j in chosen:
+        team = characters.loc[j, 'alignment']
+
+        if characters.loc[j, 'forced_evil']:
+            team = "Evil"
+            turned_evil.append((i, j))
+            notes.append(f"{characters.loc[j, 'name']} is evil because of the {characters.loc[j, 'forced_evil']}")
+
+        drunk_flag = bool(players.loc[i, 'drunk'])
+
+        # From the fitted model without S's selection jitter, on the team as played and after the hooks
+        # (e.g. a drunk copy's reduced strength), so the outcome simulation runs on the model itself
+        elo = players.loc[i, 'elo_good'] if team == "Good" else players.loc[i, 'elo_evil']
+        win_probability = fitted_win_probability(float(elo), float(characters.loc[j, 'base_strength']), problem['weights'])
+
+        assigned.append({
+            'player': players.loc[i, 'name'],
+            'character': characters.loc[j, 'name'],
+            'role_type': characters.loc[j, 'role_type'],
+            'win_probability': float(win_probability),
+            'team': team,
+            'drunk': "Drunk" if drunk_flag else "_"
+        })
+
+    return AssignmentResult(
+        assignment=pd.DataFrame(assigned),
+        adjusted_requirements={role_type: int(round(value(required)))
+                               for role_type, required in model['adjusted_requirements'].items()},
+        logs=list(model['logs']),
+        stats=stats,
+        # From the teams as played, after the hooks turned any seats Evil
+        excess=formulation.excess_imbalance(chosen, S, model['teams'], turned_evil=turned_evil),
+        bias=float(sum(B[i][j] for i, j in chosen)),
+        notes="\n".join(notes),
+        pairs=chosen,
+        choices=[(int(players.loc[i, 'player_id']), characters.loc[j, 'name']) for i, j in chosen],
+        seed=seed,
+        messages=log,
+    )
+
+
+## A per-solve copy of the problem, with the characters shuffled from rng to break deterministic ties.
+## Rules and hooks write to the players/characters frames, so the loaded problem itself is left untouched.
+def shuffled_problem(problem, rng):
+    characters = problem['characters'].sample(frac=1, random_state=rng).reset_index(drop=True)
+    return dict(problem, players=problem['players'].copy(), characters=characters)
+
+
+## A result's (player_id, character name) choices as (player, character) index pairs of a problem, whose
+## characters may be shuffled differently from the solve that made them
+def choice_pairs(problem, choices):
+    rows = {player_id: i for i, player_id in enumerate(problem['players']['player_id'])}
+    columns = {name: j for j, name in enumerate(problem['characters']['name'])}
+    return [(rows[player_id], columns[name]) for player_id, name in choices]
+
+
+## Pure core: builds and solves one assignment for a loaded problem, with no printing or prompting.
+## Every random draw (the character shuffle, score jitter, objective noise and the character rules' draws)
+## comes from one generator seeded with seed, so the same problem and seed give the same result.
+## rejected is a list of earlier results' choices to steer away from; each seed shuffles the characters
+## differently, so they are mapped into this solve's column order first.
+def generate_assignment(problem, seed, vectorised=VECTORISED_SCORES, engine=ENGINE, solver_settings=None, rejected=()):
+    rng = np.random.default_rng(seed)
+    problem = shuffled_problem(problem, rng)
+    rejected = [choice_pairs(problem, choices) for choices in rejected]
+
+    log = []
+    model = build_model(problem, rng, vectorised, engine, log)
+    stats = solve_model(model, solver_settings, rejected, log)
+    if stats['status'] != "Optimal":
+        return AssignmentResult(pd.DataFrame(), {}, list(model['logs']), stats, seed=seed, messages=log)
+    return summarise_solution(model, problem, stats, seed, log)
+
+
+## Prints a result the way the interactive set-up shows it
+def print_assignment(result, player_requirements):
+    for message in result.messages:
+        print(message)
+
+    # Diagnostics
+    print("Objective components:")
+    print("  Excess imbalance:", result.excess)
+    print("  Bias score:", result.bias)
+    if result.solved:
+        print(" ", simulation.describe(simulation.simulate_outcomes(result.assignment, seed=result.seed)))
+
+    print("\nFinal Assignments:")
+    print(result.assignment.to_string(index=False))
+    print("\n========== Final Adjusted Role Requirements ==========")
+    for role_type in ['Townsfolk', 'Outsider', 'Minion', 'Demon']:
+        base = player_requirements.get(role_type, 0)
+        adjusted = result.adjusted_requirements.get(role_type, base)
+        print(f"{role_type}: base={base}, enforced={adjusted}")
+    print("======================================================\n")
+    print(result.logs)
+    print(result.notes)
+
+
+## Interactive set-up: shows one assignment at a time until the storyteller accepts one, and returns it
+def assignments(script_name, player_list, vectorised=VECTORISED_SCORES, rng=None, fit_backend=FIT_BACKEND, solver_settings=None,
+                engine=ENGINE):
+    problem = load_problem(script_name, player_list, fit_backend)
+    if problem is None:
+        return
+    if rng is None:
+        rng = np.random.default_rng()
 
-        df = pd.DataFrame(assigned)
-        print("\nFinal Assignments:")
-        print(df.to_string(index=False))
-        print("\n========== Final Adjusted Role Requirements ==========")
-        for role_type in ['Townsfolk', 'Outsider', 'Minion', 'Demon']:
-            base = player_requirements.get(role_type, 0)
-            adjusted = adjusted_requirements.get(role_type, base)
-            print(f"{role_type}: base={base}, enforced={adjusted}")
-        print("======================================================\n")
-        print(logging_results)
-        print(to_output)
+    rejected = []  # (player_id, character name) choices of every assignment turned down so far
+    while True:
+        result = generate_assignment(problem, int(rng.integers(2**32)), vectorised, engine, solver_settings, rejected)
+        print_assignment(result, problem['player_requirements'])
+        if not result.solved:
+            print("No valid assignment found")
 
         # accept?
         valid_accept = False
         while not valid_accept:
             accept_assign = str(input("Accept assignment? Y/N   ")).upper()
             if accept_assign == "Y":
-                accept = True
-                valid_accept = True
+                return result
             elif accept_assign == "N":
                 valid_accept = True
+                if result.solved:
+                    rejected.append(result.choices)
             else:
                 print("Please enter valid option")
 
 
- ## Sample example   
-script = "Trouble_brewing"
-# players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana"]
-players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana", "Elia"]
-# players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana", "Elia", "Alona"]
-# players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana", "Elia", "Alona", "Rowan2", "George"]
-
-assignments(script, players)
+## Generates k distinct assignments in one call, ranked best first by excess imbalance and then bias score.
+## The MILP engine keeps one model and re-solves it k times, each solve cut off from every earlier solution
+## unless at least min_changes players change character (a solution pool). The two-stage engine generates
+## each candidate from a fresh seed and skips repeats. With workers set, the candidates are instead k seeded
+## variants solved at once on a process pool (see parallel_solve.py), again skipping repeats.
+def diverse_assignments(script_name, player_list, k=5, min_changes=3, vectorised=VECTORISED_SCORES, rng=None,
+                        fit_backend=FIT_BACKEND, solver_settings=None, engine=ENGINE, problem=None, workers=None):
+    if problem is None:
+        problem = load_problem(script_name, player_list, fit_backend)
+        if problem is None:
+            return []
+    if rng is None:
+        rng = np.random.default_rng()
+
+    if workers:
+        import parallel_solve
+        results = []
+        for result in parallel_solve.parallel_assignments(problem, k, int(rng.integers(2**32)), workers,
+                                                          vectorised, engine, solver_settings):
+            if result.solved and all(set(result.choices) != set(other.choices) for other in results):
+                results.append(result)
+        return rank_assignments(results)
+
+    if engine == "two_stage":
+        results = []
+        for _ in range(3 * k):
+            result = generate_assignment(problem, int(rng.integers(2**32)), vectorised, engine, solver_settings)
+            if not result.solved:
+                break
+            if all(set(result.choices) != set(other.choices) for other in results):
+                results.append(result)
+            if len(results) == k:
+                break
+        return rank_assignments(results)
+
+    # Solution pool: the pool's results share one model, so they carry no individual seed
+    problem = shuffled_problem(problem, rng)
+    build_log = []
+    model = build_model(problem, rng, vectorised, engine, build_log)
+    results = []
+    for n in range(k):
+        log = list(build_log)
+        stats = solve_model(model, solver_settings, log=log)
+        if stats['status'] != "Optimal":
+            break
+        result = summarise_solution(model, problem, stats, log=log)
+        solver.exclude_assignment(model['prob'], model['x'], result.pairs, min_changes, f"pool_{n}")
+        results.append(result)
+    return rank_assignments(results)
+
+
+## Best first: lowest excess imbalance, then highest bias score
+def rank_assignments(results):
+    return sorted(results, key=lambda result: (round(result.excess, 9), -result.bias))
+
+
+## Interactive batch mode: shows k ranked assignments at once and lets the storyteller pick one by number
+def choose_assignment(script_name, player_list, k=5, **kwargs):
+    problem = load_problem(script_name, player_list, kwargs.pop('fit_backend', FIT_BACKEND))
+    if problem is None:
+        return
+    while True:
+        results = diverse_assignments(script_name, player_list, k, problem=problem, **kwargs)
+        if not results:
+            print("No valid assignment found")
+            return
+        reports = simulation.compare_assignments(results)
+        for rank, (result, report) in enumerate(zip(results, reports), start=1):
+            print(f"\n===== Option {rank}: excess imbalance {result.excess:.3f}, bias score {result.bias:.3f} =====")
+            print(simulation.describe(report))
+            print(result.assignment.to_string(index=False))
+            if result.notes:
+                print(result.notes)
+
+        pick = str(input(f"\nPick an assignment 1-{len(results)} or N for a new batch:   ")).strip().upper()
+        if pick.isdigit() and 1 <= int(pick) <= len(results):
+            return results[int(pick) - 1]
+        elif pick != "N":
+            print("Please enter valid option")
+
+
+ ## Sample example
+if __name__ == "__main__":
+    script = "Trouble_brewing"
+    # players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana"]
+    players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana", "Elia"]
+    # players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana", "Elia", "Alona"]
+    # players = ["Liza","Madi", "Rita", "Pedro", "Jed", "Oli", "Rowan", "Gana", "Elia", "Alona", "Rowan2", "George"]
+
+    assignments(script, players)
@@ -1,290 +1,340 @@
-import random
-from pulp import LpVariable, lpSum, LpBinary, value
+## CHARACTER CONSTRAINTS ##
+# The character rules are data: each entry below says what a character does to the game set-up, and
+# compile_rules turns the rules for one script and table size into per-option role counts once (cached).
+# apply_rules then writes every rule's rows onto a solve's grid in one pass, and returns the post-solve
+# effects as hooks. Adding a rule for a new character is an entry in character_constraints, not code.
+from functools import lru_cache
+from pulp import LpVariable, LpAffineExpression, LpBinary, value
+import formulation
 
+# Largest random weight on a rule option in the objective; breaks ties between feasible options so
+# rerolls vary the set-up (e.g. the Balloonist's +0/+1 Outsiders) without outweighing the bias scores
+OPTION_NOISE = 0.5
 
-# ----------------------------
-# Utility
-# ----------------------------
-def _binary_var(name, prob, x, char_index, players):
-    """Helper to create a binary var that is 1 if the character is assigned."""
-    var = LpVariable(name, cat="Binary")
-    prob += lpSum(x[i][char_index] for i in range(len(players))) == var
-    return var
 
 # ----------------------------
-# Character Constraints
+# Rules
 # ----------------------------
+# Every field is optional:
+#   "note":         shown in the solve log when the character is on the script
+#   "options":      set-up changes while the character is in play; the solve picks exactly one. Each option is a
+#                   list of (from role type, to role type, count) moves, and a move never takes a role below zero
+#   "set_outsiders": options that set the Outsider count to each of these values, Townsfolk making up the rest
+#   "replace_minions": options that replace every Minion with each split of Townsfolk and Outsiders
+#   "requires":     characters that must be in play whenever this one is (it can't be in play if one is missing)
+#   "counts_as":    the role type the character's own seat counts as
+#   "copies":       how many copies of the character the script holds (load_problem adds the extra columns)
+#   "turns_evil":   (role type, count) Good characters of that role type in play that become Evil
+#   "effects":      post-solve effects: "drunk_copy" (one of 2+ copies is drunk), "babysitter" (names the
+#                   Minion holding Lil' Monsta), "evil_neighbours" (the players either side become Evil Minions)
+character_constraints = {
+    "Balloonist": {"note": "Balloonist → Outsiders +0/+1, Townsfolk -0/-1",
+                   "options": [[], [("Townsfolk", "Outsider", 1)]]},
+    "Bounty Hunter": {"note": "Bounty Hunter → one Good Townsfolk in play is Evil",
+                      "turns_evil": ("Townsfolk", 1)},
+    "Choirboy": {"note": "Choirboy → King must also be in play",
+                 "requires": ["King"]},
+    # The Damsel is an Outsider, so the Huntsman may need an Outsider slot for it
+    "Huntsman": {"note": "Huntsman → Damsel must also be in play",
+                 "requires": ["Damsel"],
+                 "options": [[], [("Townsfolk", "Outsider", 1)]]},
+    "Village Idiot": {"note": "Village Idiot → 0-3 allowed, if ≥2 then one player is drunk",
+                      "copies": 3,
+                      "effects": ["drunk_copy"]},
+    "Hermit": {"note": "Hermit → Outsiders -0/-1, Townsfolk +0/+1",
+               "options": [[], [("Outsider", "Townsfolk", 1)]]},
+    "Baron": {"note": "Baron → Outsiders +2, Townsfolk -2",
+              "options": [[("Townsfolk", "Outsider", 2)]]},
+    "Godfather": {"note": "Godfather → Outsiders -1/+1, Townsfolk +1/-1",
+                  "options": [[("Outsider", "Townsfolk", 1)], [("Townsfolk", "Outsider", 1)]]},
+    "Summoner": {"note": "Summoner → Demons -1, Townsfolk +1",
+                 "options": [[("Demon", "Townsfolk", 1)]]},
+    "Xaan": {"note": "Xaan → Outsiders set to 1-4",
+             "set_outsiders": [1, 2, 3, 4]},
+    "Fang Gu": {"note": "Fang Gu → Outsiders +1, Townsfolk -1",
+                "options": [[("Townsfolk", "Outsider", 1)]]},
+    "Kazali": {"note": "Kazali → Minions replaced with Townsfolk and Outsiders",
+               "replace_minions": True},
+    # Nobody plays Lil' Monsta as a Demon: its seat is the Minion babysitting it
+    "Lil' Monsta": {"note": "Lil' Monsta → Demons -1, Minions +1, one Minion babysits",
+                    "options": [[("Demon", "Minion", 1)]],
+                    "counts_as": "Minion",
+                    "effects": ["babysitter"]},
+    "Lord of Typhon": {"note": "Lord of Typhon → Minions replaced with Townsfolk and Outsiders, neighbours become Minions",
+                       "replace_minions": True,
+                       "effects": ["evil_neighbours"]},
+    "Vigormortis": {"note": "Vigormortis → Outsiders -1, Townsfolk +1",
+                    "options": [[("Outsider", "Townsfolk", 1)]]},
+}
 
-def balloonist_constraint(prob, x, characters, players, player_requirements, char_index):
-    num_players = len(players)
-    balloonist_in_play = lpSum(x[i][char_index] for i in range(num_players))
-    return {
-        "Outsider": +balloonist_in_play,
-        "Townsfolk": -balloonist_in_play,
-        "_log": "Balloonist → Outsiders +1, Townsfolk -1"
-    }
-
-
-def bounty_hunter_constraint(prob, x, characters, players, player_requirements, bh_index):
-    num_players = len(players)
 
-    # Candidate pool: only Good Townsfolk/Outsiders, EXCLUDING the BH themself
-    valid_targets = characters[
-        (characters['alignment'] == 'Good') &
-        (characters['role_type'].isin(['Townsfolk'])) &
-        (characters.index != bh_index)   # <-- exclude BH
-    ].index.tolist()
+# ----------------------------
+# Compilation
+# ----------------------------
+## Column names for a character and its copies ("Village Idiot", "Village Idiot 2", ...)
+def copy_names(name, copies=1):
+    return [name] + [f"{name} {k}" for k in range(2, copies + 1)]
+
+
+## Adds the extra copy columns for every character on the script whose rule has "copies"
+def add_copies(characters):
+    import pandas as pd
+
+    rules = {name.lower(): rule for name, rule in character_constraints.items()}
+    extra = []
+    for name in characters['name']:
+        copies = rules.get(name.lower(), {}).get("copies", 1)
+        original = characters[characters['name'] == name]
+        for copy_name in copy_names(name, copies)[1:]:
+            extra.append(original.assign(name=copy_name))
+    if not extra:
+        return characters
+    return pd.concat([characters] + extra, ignore_index=True)
+
+
+## Role count change of one option, with each move limited by the base count of the role it moves from
+def _option_deltas(moves, base):
+    deltas = {}
+    for source, target, count in moves:
+        moved = max(0, min(count, base[source] + deltas.get(source, 0)))
+        deltas[source] = deltas.get(source, 0) - moved
+        deltas[target] = deltas.get(target, 0) + moved
+    return {role_type: delta for role_type, delta in deltas.items() if delta}
+
+
+## Expands a rule's option generators into plain role count changes
+def _rule_options(rule, base):
+    options = [_option_deltas(moves, base) for moves in rule.get("options", [])]
+    for outsiders in rule.get("set_outsiders", []):
+        change = outsiders - base['Outsider']
+        if change <= base['Townsfolk']:
+            options.append({role_type: delta for role_type, delta in
+                            (('Outsider', change), ('Townsfolk', -change)) if delta})
+    if rule.get("replace_minions"):
+        minions = base['Minion']
+        options += [{role_type: delta for role_type, delta in
+                     (('Minion', -minions), ('Townsfolk', k), ('Outsider', minions - k)) if delta}
+                    for k in range(minions + 1)]
+    return options
+
+
+@lru_cache(maxsize=64)
+def _compile(script_characters, base_counts):
+    base = dict(base_counts)
+    on_script = {name.lower(): name for name, _, _ in script_characters}
+    compiled = []
+    for rule_name, rule in character_constraints.items():
+        name = on_script.get(rule_name.lower())
+        if name is None:
+            continue
+        required = [on_script.get(other.lower(), other) for other in rule.get("requires", [])]
+        target_role, target_count = rule.get("turns_evil", (None, 0))
+        compiled.append({
+            'name': name,
+            'note': rule.get("note", name),
+            'columns': [copy for copy in copy_names(name, rule.get("copies", 1)) if copy.lower() in on_script],
+            'options': _rule_options(rule, base),
+            'requires': [other for other in required if other.lower() in on_script],
+            'missing': [other for other in required if other.lower() not in on_script],
+            'counts_as': rule.get("counts_as"),
+            'evil_pool': [other for other, role_type, alignment in script_characters
+                          if role_type == target_role and alignment == 'Good' and other != name],
+            'evil_count': target_count,
+            'effects': list(rule.get("effects", [])),
+        })
+
+    # Most characters of each role type that can be in play once every rule has made its largest change
+    role_limits = dict(base)
+    for rule in compiled:
+        for role_type in role_limits:
+            role_limits[role_type] += max([0] + [option.get(role_type, 0) for option in rule['options']])
+        if rule['counts_as']:
+            role_limits[rule['counts_as']] += len(rule['columns'])
+    return {'rules': compiled, 'base': base, 'role_limits': role_limits}
+
+
+## Parses the rules for a script's characters and base role counts. Cached, so every reroll of the
+## same script and table size reuses the first parse.
+def compile_rules(characters, player_requirements):
+    script_characters = tuple(sorted(zip(characters['name'], characters['role_type'], characters['alignment'])))
+    return _compile(script_characters, tuple(sorted(player_requirements.items())))
 
-    if not valid_targets:
-        return {"_log": "Bounty Hunter present but no valid targets in script"}
 
-    # Binary vars for target choice
-    target_vars = {j: LpVariable(f"bh_target_{j}", cat=LpBinary) for j in valid_targets}
+# ----------------------------
+# Model rows
+# ----------------------------
+## Writes the compiled rules onto a solve's grid. Returns the adjusted role requirements (expressions in the
+## rule option variables), the objective terms that randomise the option choice, the post-solve hooks, the
+## log notes and the balance terms (builders called with S and the teams once the scores exist, see
+## _neighbours_balance). Seats with "counts_as" are relabelled in characters, so call this before column_groups.
+def apply_rules(prob, x, characters, compiled, rng):
+    num_players = len(x)
+    index = {name: j for j, name in enumerate(characters['name'])}
+    requirements = {role_type: LpAffineExpression(constant=count)
+                    for role_type, count in compiled['base'].items()}
+    objective = LpAffineExpression()
+    hooks, logs, balance = [], [], []
+
+    in_play = lambda names: formulation.grid_expression(x, [(i, index[name]) for name in names for i in range(num_players)])
+    for k, rule in enumerate(compiled['rules']):
+        logs.append(rule['note'])
+        present = in_play(rule['columns'])
+        columns = [index[name] for name in rule['columns']]
+
+        if rule['missing']:
+            prob += present == 0, f"rule_{k}_missing"
+            logs.append(f"{rule['name']} can't be in play: {', '.join(rule['missing'])} not on the script")
+        for other in rule['requires']:
+            prob += present <= in_play([other]), f"rule_{k}_requires_{index[other]}"
+
+        if rule['counts_as']:
+            characters.loc[columns, 'role_type'] = rule['counts_as']
+
+        # One option is chosen while the character is in play (a single option is a plain delta)
+        options = rule['options']
+        if len(options) == 1:
+            for role_type, delta in options[0].items():
+                requirements[role_type] += delta * present
+        elif options:
+            chosen = [LpVariable(f"rule_{k}_option_{o}", cat=LpBinary) for o in range(len(options))]
+            prob += LpAffineExpression([(var, 1) for var in chosen]) - present == 0, f"rule_{k}_options"
+            for var, option in zip(chosen, options):
+                for role_type, delta in option.items():
+                    requirements[role_type].addterm(var, delta)
+            for var, weight in zip(chosen, rng.uniform(0, OPTION_NOISE, len(options))):
+                objective.addterm(var, float(weight))
+
+        if rule['evil_count'] and not rule['evil_pool']:
+            logs.append(f"{rule['name']} present but no valid targets in script")
+        elif rule['evil_count']:
+            targets = {index[name]: LpVariable(f"rule_{k}_target_{index[name]}", cat=LpBinary) for name in rule['evil_pool']}
+            prob += LpAffineExpression([(var, 1) for var in targets.values()]) - rule['evil_count'] * present == 0, f"rule_{k}_targets"
+            for j, var in targets.items():
+                prob += in_play([characters['name'].iat[j]]) - var >= 0, f"rule_{k}_target_{j}_in_play"
+            hooks.append(_turns_evil_hook(rule['name'], targets))
+
+        for effect in rule['effects']:
+            hooks.append(effects[effect](rule['name'], x, columns, rng))
+            if effect in balance_effects:
+                balance.append(balance_effects[effect](prob, x, columns, k))
+
+    return {'requirements': requirements, 'objective': objective, 'hooks': hooks, 'logs': logs, 'balance': balance}
 
-    # Presence variable: BH in play
-    bh_in_play = lpSum(x[i][bh_index] for i in range(num_players))
 
-    # Exactly one target iff BH is in play
-    prob += lpSum(target_vars[j] for j in valid_targets) == bh_in_play
+# ----------------------------
+# Post-solve effects
+# ----------------------------
+# Each effect builder returns a hook(characters, players) that runs on copies of the problem's frames
+# after the solve and returns a log message
 
-    # Link target choice to assignment
-    for j in valid_targets:
-        assigned_j = lpSum(x[i][j] for i in range(num_players))
-        prob += assigned_j >= target_vars[j]
-        prob += assigned_j <= 1
+## (player, character) pairs assigned in the given columns
+def _assigned(x, columns):
+    return [(i, j) for j in columns for i in range(len(x)) if value(x[i][j]) and value(x[i][j]) > 0.5]
 
-    if 'forced_evil' not in characters.columns:
-        characters['forced_evil'] = False
 
+def _turns_evil_hook(name, targets):
     def hook(characters_df, players_df):
-        chosen = None
-        for j in valid_targets:
-            if value(target_vars[j]) == 1:
-                chosen = j
-                break
-        if chosen is not None:
-            characters_df.loc[chosen, 'forced_evil'] = True
-            return f"Bounty Hunter target: {characters_df.loc[chosen,'name']} (forced Evil)"
-        if value(bh_in_play) == 0:
-            return "Bounty Hunter not in play (no target)"
-        return "Bounty Hunter target not resolved"
-
-    return {
-        "_log": "Bounty Hunter → target chosen iff BH in play; target must be assigned",
-        "_hook": hook
-    }
-
-
+        chosen = [j for j, var in targets.items() if value(var) and value(var) > 0.5]
+        for j in chosen:
+            characters_df.loc[j, 'forced_evil'] = name
+        if chosen:
+            return f"{name} target: {', '.join(characters_df.loc[chosen, 'name'])} (forced Evil)"
+        return f"{name} not in play (no target)"
+    return hook
 
 
-def choirboy_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("choirboy_in_play", prob, x, char_index, players)
-    king_index = characters[characters['name'] == 'King'].index[0]
-    prob += lpSum(x[i][king_index] for i in range(len(players))) >= var
-    return {"_log": "Choirboy → King must also be in play"}
-
-def huntsman_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("huntsman_in_play", prob, x, char_index, players)
-    damsel_index = characters[characters['name'] == 'Damsel'].index[0]
-    prob += lpSum(x[i][damsel_index] for i in range(len(players))) >= var
-    return {"_log": "Huntsman → Damsel must also be in play"}
+def _drunk_copy(name, x, columns, rng):
+    def hook(characters_df, players_df):
+        assigned = _assigned(x, columns)
+        if len(assigned) >= 2:
+            # Randomly choose one of the assigned copies to be drunk
+            drunk_player, drunk_char = assigned[rng.integers(len(assigned))]
+            players_df.loc[drunk_player, 'drunk'] = True
+            characters_df.loc[drunk_char, 'base_strength'] = 15.0
+            return f"{name} → {players_df.loc[drunk_player, 'name']} is drunk (strength reduced)"
+        if assigned:
+            return f"{name} → in play (no drunk applied)"
+        return f"{name} not in play"
+    return hook
 
 
-def village_idiot_constraint(prob, x, characters, players, player_requirements, _):
-    """
-    Village Idiot:
-    - Between 0 and 3 inclusive can be assigned in a game.
-    - If 2 or more are in play, one of the assigned players is drunk.
-    """
-    num_players = len(players)
+def _babysitter(name, x, columns, rng):
+    def hook(characters_df, players_df):
+        assigned = _assigned(x, columns)
+        if assigned:
+            return f"{name} → Minion '{players_df.loc[assigned[0][0], 'name']}' babysits"
+        return f"{name} not in play"
+    return hook
 
-    # All indices for Village Idiot variants (e.g. Village Idiot, Village Idiot 2, etc.)
-    vi_indices = characters[characters['name'].str.startswith('Village Idiot')].index.tolist()
 
-    # Count how many are assigned
-    vi_count = lpSum(x[i][j] for i in range(num_players) for j in vi_indices)
+def _evil_neighbours(name, x, columns, rng):
+    def hook(characters_df, players_df):
+        assigned = _assigned(x, columns)
+        if not assigned:
+            return f"{name} not in play"
+        seated = dict(_assigned(x, range(len(x[0]))))
+        lord = assigned[0][0]
+        # Players sit in a circle in the order they were entered (load_problem keeps that order)
+        neighbours = [(lord - 1) % len(x), (lord + 1) % len(x)]
+        for i in neighbours:
+            characters_df.loc[seated[i], 'role_type'] = 'Minion'
+            characters_df.loc[seated[i], 'forced_evil'] = name
+        return (f"{name} → Neighbours '{players_df.loc[neighbours[0], 'name']}' and "
+                f"'{players_df.loc[neighbours[1], 'name']}' set as Minions")
+    return hook
+
+
+effects = {
+    "drunk_copy": _drunk_copy,
+    "babysitter": _babysitter,
+    "evil_neighbours": _evil_neighbours,
+}
 
-    # Enforce between 0 and 3
-    prob += vi_count <= 3
 
-    def hook(characters_df, players_df):
-        assigned_pairs = []
-        for i in range(len(players_df)):
-            for j in vi_indices:
-                if x[i][j].value() == 1:
-                    assigned_pairs.append((i, j))
-
-        if len(assigned_pairs) >= 2:
-            # Randomly choose one of the assigned VIs to be drunk
-            drunk_player, drunk_char = random.choice(assigned_pairs)
-            players_df.loc[drunk_player, 'drunk'] = True
-            # Reduce their effective strength so balancing accounts for it
-            characters_df.loc[drunk_char, 'base_strength'] = 15.0
-            return f"Village Idiot → {players_df.loc[drunk_player,'name']} is drunk (strength reduced)"
-        elif len(assigned_pairs) == 1:
-            return "Village Idiot → in play (no drunk applied)"
-        return "Village Idiot not in play"
-
-    return {
-        "_log": "Village Idiot → 0-3 allowed, if ≥2 then one player is drunk",
-        "_hook": hook
-    }
-
-
-def hermit_constraint(prob, x, characters, players, player_requirements, char_index):
-    num_players = len(players)
-    hermit_in_play = lpSum(x[i][char_index] for i in range(num_players))
-    return {
-        "Outsider": -hermit_in_play,
-        "Townsfolk": +hermit_in_play,
-        "_log": "Hermit → Outsiders -1, Townsfolk +1"
-    }
-
-
-def baron_constraint(prob, x, characters, players, player_requirements, char_index):
-    num_players = len(players)
-    baron_in_play = lpSum(x[i][char_index] for i in range(num_players))
-    return {
-        "Outsider": +2 * baron_in_play,
-        "Townsfolk": -2 * baron_in_play,
-        "_log": "Baron → Outsiders +2, Townsfolk -2"
-    }
-
-
-
-def godfather_constraint(prob, x, characters, players, player_requirements, char_index):
-    num_players = len(players)
-    godfather_in_play = lpSum(x[i][char_index] for i in range(num_players))
-    return {
-        "Outsider": -1 * godfather_in_play,
-        "Townsfolk": +1 * godfather_in_play,
-        "_log": "Godfather → Outsiders -1, Townsfolk +1"
-    }
-
-
-
-# Summoner: -1 Demon, +1 Townsfolk
-def summoner_constraint(prob, x, characters, players, player_requirements, char_index):
-    num_players = len(players)
-    summoner_in_play = lpSum(x[i][char_index] for i in range(num_players))
-    return {
-        "Demon": -1 * summoner_in_play,
-        "Townsfolk": +1 * summoner_in_play,
-        "_log": "Summoner → Demons -1, Townsfolk +1"
-    }
-
-
-
-# Xaan: Outsiders set to random 1–4
-def xaan_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("xaan_in_play", prob, x, char_index, players)
-    outsiders = random.randint(1, 4)
-    return {
-        "Outsider": outsiders * var,
-        "_log": f"Xaan → Outsiders set to {outsiders}"
-    }
-
-# Fang Gu: +1 Outsider, -1 Townsfolk
-def fanggu_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("fanggu_in_play", prob, x, char_index, players)
-    return {
-        "Outsider": player_requirements['Outsider'] + 1 * var,
-        "Townsfolk": player_requirements['Townsfolk'] - 1 * var,
-        "_log": "Fang Gu → Outsiders +1, Townsfolk -1"
-    }
-
-# Kazali: No Minions, replace with random mix of Townsfolk/Outsiders
-def kazali_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("kazali_in_play", prob, x, char_index, players)
-    missing_minions = player_requirements['Minion']
-    # Random split between Townsfolk and Outsiders
-    extra_townsfolk = random.randint(0, missing_minions)
-    extra_outsiders = missing_minions - extra_townsfolk
-    return {
-        "Minion": 0,
-        "Townsfolk": player_requirements['Townsfolk'] + extra_townsfolk * var,
-        "Outsider": player_requirements['Outsider'] + extra_outsiders * var,
-        "_log": f"Kazali → Minions replaced with {extra_townsfolk} Townsfolk + {extra_outsiders} Outsiders"
-    }
-
-# Lil' Monsta: -1 Demon, +1 Minion, one Minion babysits
-def lilmonsta_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("lilmonsta_in_play", prob, x, char_index, players)
-    def hook(characters, players):
-        minion_indices = characters[characters['role_type'] == 'Minion'].index.tolist()
-        if minion_indices:
-            babysitter_index = random.choice(minion_indices)
-            characters.loc[babysitter_index, 'base_strength'] += 20
-            return f"Lil' Monsta → Minion '{characters.loc[babysitter_index,'name']}' babysits (strength boosted)"
-        return "Lil' Monsta in play but no Minion available"
-    return {
-        "Demon": player_requirements['Demon'] - 1 * var,
-        "Minion": player_requirements['Minion'] + 1 * var,
-        "_log": "Lil' Monsta → Demons -1, Minions +1",
-        "_hook": hook
-    }
-
-# Lord of Typhon: No Minions, replace with Townsfolk/Outsiders, neighbours become Minions
-def lord_of_typhon_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("lord_typhon_in_play", prob, x, char_index, players)
-    missing_minions = player_requirements['Minion']
-    extra_townsfolk = random.randint(0, missing_minions)
-    extra_outsiders = missing_minions - extra_townsfolk
-    def hook(characters, players):
-        # Find Lord of Typhon's assigned player index
-        lord_index = char_index
-        # Neighbours in circular seating
-        left = (lord_index - 1) % len(players)
-        right = (lord_index + 1) % len(players)
-        # Force them to be Minions
-        characters.loc[left, 'role_type'] = 'Minion'
-        characters.loc[right, 'role_type'] = 'Minion'
-        characters.loc[left, 'alignment'] = 'Evil'
-        characters.loc[right, 'alignment'] = 'Evil'
-        return f"Lord of Typhon → Neighbours '{players.loc[left,'name']}' and '{players.loc[right,'name']}' set as Minions"
-    return {
-        "Minion": 0,
-        "Townsfolk": player_requirements['Townsfolk'] + extra_townsfolk * var,
-        "Outsider": player_requirements['Outsider'] + extra_outsiders * var,
-        "_log": f"Lord of Typhon → Minions replaced with {extra_townsfolk} Townsfolk + {extra_outsiders} Outsiders, neighbours become Minions",
-        "_hook": hook
-    }
-
-# Vigormortis: -1 Outsider, +1 Townsfolk
-def vigormortis_constraint(prob, x, characters, players, player_requirements, char_index):
-    var = _binary_var("vigormortis_in_play", prob, x, char_index, players)
-    return {
-        "Outsider": player_requirements['Outsider'] - 1 * var,
-        "Townsfolk": player_requirements['Townsfolk'] + 1 * var,
-        "_log": "Vigormortis → Outsiders -1, Townsfolk +1"
-    }
 # ----------------------------
-# Registry
+# Balance terms
 # ----------------------------
-character_constraints = {
-    "Balloonist": balloonist_constraint,
-    "Bounty Hunter": bounty_hunter_constraint,
-    "Choirboy": choirboy_constraint,
-    "Huntsman": huntsman_constraint,
-    "Village Idiot": village_idiot_constraint,
-    "Hermit": hermit_constraint,
-    "Baron": baron_constraint,
-    "Godfather": godfather_constraint,
-    "Summoner": summoner_constraint,
-    "Xaan": xaan_constraint,
-    "Fang Gu": fanggu_constraint,
-    "Kazali": kazali_constraint,
-    "Lil' Monsta": lilmonsta_constraint,
-    "Lord of Typhon": lord_of_typhon_constraint,
-    "Vigormortis": vigormortis_constraint
-
+# Effects that change a seat's team after the solve also need the MILP's team balance to see the change,
+# or the table is balanced with the wrong teams. Each builder returns balance(S, teams), which adds its
+# variables to prob and returns the correction to (av_good - av_evil) (see formulation.add_balance_and_objective).
+
+## The Lord of Typhon's neighbours play Evil. Seat n is a neighbour when the Lord sits at n - 1 or n + 1,
+## y_n = lord[n - 1] + lord[n + 1]; a Good character c at a neighbour seat moves its score from the Good
+## average to the Evil one. The product y_n * x[n][c] is linearised as a continuous w (exact, as both
+## factors are binary): w <= x, w <= y, w >= x + y - 1.
+def _neighbours_balance(prob, x, columns, k):
+    num_players = len(x)
+
+    def balance(S, teams):
+        correction = LpAffineExpression()
+        if num_players < 3:
+            return correction
+        num_good = len(teams['Good']) or 1
+        num_evil = len(teams['Evil']) or 1
+        lord = [formulation.grid_expression(x, [(i, j) for j in columns]) for i in range(num_players)]
+        for n in range(num_players):
+            neighbour = lord[(n - 1) % num_players] + lord[(n + 1) % num_players]
+            for c in teams['Good']:
+                if c in columns or not isinstance(x[n][c], LpVariable):
+                    continue
+                w = LpVariable(f"rule_{k}_neighbour_{n}_{c}", lowBound=0, upBound=1)
+                prob.addConstraint(w - x[n][c] <= 0, f"rule_{k}_neighbour_{n}_{c}_seat")
+                prob.addConstraint(w - neighbour <= 0, f"rule_{k}_neighbour_{n}_{c}_lord")
+                prob.addConstraint(w - x[n][c] - neighbour >= -1, f"rule_{k}_neighbour_{n}_{c}_both")
+                correction.addterm(w, -S[n][c] * (1 / num_good + 1 / num_evil))
+        return correction
+    return balance
+
+
+balance_effects = {
+    "evil_neighbours": _neighbours_balance,
 }
 
 
 
 ########################## CHARACTER CONSTRAINTS ##########################
 ## ATHEIST & LEGION BEING IGNORED DUE TO BEING EXPERIMENTAL ##
-# Balloonist   
+# Balloonist
     # +0/+1 outsiders, -0/-1 townsfolk
         # Randomly choose which
 
@@ -316,7 +366,7 @@ character_constraints = {
     # -1 demons, +1 townsfolk
 
 # Xaan
-    # x outsiders 
+    # x outsiders
         # x being any number from 1-4 (probably)
 
 # Fang Gu
@@ -326,16 +376,12 @@ character_constraints = {
     # No minion in play, instead the minion requirements are replaced with a random combination of townsfolk and outsiders to make up the number of minions missing
 
 # Lil' monsta
-    # -1 demon, +1 minion 
-        # Randomly assign one of the minions to be babysitting the lil' monsta  
+    # -1 demon, +1 minion
+        # Randomly assign one of the minions to be babysitting the lil' monsta
 
 # Lord of Typhon
     # No minion in play, instead the minion requirements are replaced with a random combination of townsfolk and outsiders to make up the number of minions missing
     # Then the two players next to this character in the players array (looping round in a circle i.e. player i would be sat next to player i-1 and player 0) are minions, so need the minion chosen, and the game balanced accordingly
 
-# Vigormorits 
+# Vigormorits
     # -1 outsider, +1 townsfolk
-
-
-
-###########################################################################
\ No newline at end of file
@@ -0,0 +1,326 @@
+## CONSTRAINT REGRESSION ##
+# Run with: python constraint_regression.py [character ...] [--engine two_stage] [--seeds N] [--save-baseline]
+# For every rule in character_constraints and every table size in type_distribution, forces the character
+# into play on a fixture script, solves against an in-memory copy of a synthetic database and checks the
+# role counts the MILP enforced against the rule's documented effect, then checks the Lord of Typhon's
+# neighbours are taken from the seating order and rejects and rerolls an assignment at every table size
+# (pruned grids included). Exits with code 1 if any case fails.
+# Solve latency is recorded per case and compared with the saved baseline when there is one.
+import os
+import sys
+import json
+import sqlite3
+import statistics
+import numpy as np
+from pulp import lpSum
+import db_setup
+import calcs
+import formulation
+import character_constraints as rules
+from character_constraints import character_constraints
+from synthetic_db import build_synthetic_db
+
+ROLE_TYPES = ['Townsfolk', 'Outsider', 'Minion', 'Demon']
+baseline_path = os.path.join(db_setup.script_dir, "constraint_latency.json")
+
+# Characters that must be on the fixture script alongside a rule's character
+companions = {name: rule.get("requires", []) for name, rule in character_constraints.items()}
+
+# Fixture script for the reroll checks; its rule doesn't add Outsiders, so tables without any prune them
+reroll_character = "Choirboy"
+
+# Fixture script for the seating checks; its rule turns the players either side of it Evil
+seating_character = "Lord of Typhon"
+
+# Fixture scripts hold the rule's character plus the lowest-id characters without a rule, this many per role type
+fixture_role_counts = {'Townsfolk': 13, 'Outsider': 6, 'Minion': 5, 'Demon': 4}
+
+
+# ----------------------------
+# Expected role counts
+# ----------------------------
+## Moves up to n characters from one role type to another (never below zero)
+def _shift(counts, source, target, n):
+    moved = min(n, counts[source])
+    return dict(counts, **{source: counts[source] - moved, target: counts[target] + moved})
+
+
+## Every split of the Minions between Townsfolk and Outsiders
+def _minions_replaced(counts):
+    return [dict(counts, Minion=0, Townsfolk=counts['Townsfolk'] + k, Outsider=counts['Outsider'] + counts['Minion'] - k)
+            for k in range(counts['Minion'] + 1)]
+
+
+## Xaan: Outsiders set to 1-4, Townsfolk make up the rest
+def _xaan(counts):
+    good = counts['Townsfolk'] + counts['Outsider']
+    return [dict(counts, Townsfolk=good - x, Outsider=x) for x in range(1, 5) if x <= good]
+
+
+# Rule -> base role counts -> the role counts allowed with that character in play
+# (from the rule notes at the bottom of character_constraints.py, not from the rule data under test)
+expected_counts = {
+    "Balloonist": lambda c: [c, _shift(c, 'Townsfolk', 'Outsider', 1)],
+    "Bounty Hunter": lambda c: [c],
+    "Choirboy": lambda c: [c],
+    "Huntsman": lambda c: [c, _shift(c, 'Townsfolk', 'Outsider', 1)],   # the Damsel may need an Outsider slot
+    "Village Idiot": lambda c: [c],
+    "Hermit": lambda c: [c, _shift(c, 'Outsider', 'Townsfolk', 1)],
+    "Baron": lambda c: [_shift(c, 'Townsfolk', 'Outsider', 2)],
+    "Godfather": lambda c: [_shift(c, 'Outsider', 'Townsfolk', 1), _shift(c, 'Townsfolk', 'Outsider', 1)],
+    "Summoner": lambda c: [_shift(c, 'Demon', 'Townsfolk', 1)],
+    "Xaan": _xaan,
+    "Fang Gu": lambda c: [_shift(c, 'Townsfolk', 'Outsider', 1)],
+    "Kazali": _minions_replaced,
+    "Lil' Monsta": lambda c: [_shift(c, 'Demon', 'Minion', 1)],
+    "Lord of Typhon": _minions_replaced,
+    "Vigormortis": lambda c: [_shift(c, 'Outsider', 'Townsfolk', 1)],
+}
+
+
+# ----------------------------
+# Fixture database
+# ----------------------------
+## In-memory copy of a synthetic database, with one fixture script per rule named "Regression_<character>"
+def fixture_connection(num_assignments=10_000):
+    con = db_setup.get_connection(":memory:")
+    if con.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'scripts'").fetchone()[0]:
+        return con
+
+    disk = sqlite3.connect(build_synthetic_db(num_assignments))
+    disk.backup(con)
+    disk.close()
+    db_setup.migrate(con)
+
+    fillers = {role_type: [row[0] for row in con.execute("""
+    SELECT character_id
+    FROM characters
+    WHERE role_type = ? AND lower(name) NOT IN ({})
+    ORDER BY character_id
+    LIMIT ?""".format(','.join(['?'] * len(character_constraints))),
+        (role_type, *[name.lower() for name in character_constraints], count))]
+        for role_type, count in fixture_role_counts.items()}
+
+    for name in character_constraints:
+        names = [other.lower() for other in [name] + companions[name]]
+        rule_ids = [row[0] for row in con.execute(
+            "SELECT character_id FROM characters WHERE lower(name) IN ({})".format(','.join(['?'] * len(names))), names)]
+        script_id = con.execute("INSERT INTO scripts (name, type) VALUES(?, 'regression')",
+                                (f"Regression_{name}",)).lastrowid
+        character_ids = set(rule_ids).union(*fillers.values())
+        con.executemany("INSERT INTO script_characters (script_id, character_id) VALUES(?, ?)",
+                        [(script_id, character_id) for character_id in sorted(character_ids)])
+    con.commit()
+    return con
+
+
+## Table sizes whose type_distribution row adds up, with their base role counts
+def table_sizes(con):
+    sizes = {}
+    for num_players, *counts in con.execute("SELECT num_players, townsfolk, outsiders, minions, demons FROM type_distribution"):
+        if sum(counts) == num_players:
+            sizes[num_players] = dict(zip(ROLE_TYPES, counts))
+    return sizes
+
+
+# ----------------------------
+# Cases
+# ----------------------------
+## Solves one (character, table size) case with the character forced into play; returns (problems, solve seconds)
+def run_case(problem, name, base_counts, seed, engine):
+    rng = np.random.default_rng(seed)
+    problem = calcs.shuffled_problem(problem, rng)
+    characters = problem['characters']
+    model = calcs.build_model(problem, rng, engine=engine)
+    x = model['x']
+    j = characters.index[characters['name'].str.lower() == name.lower()][0]
+    model['prob'] += lpSum(x[i][j] for i in range(len(x))) == 1, "force_in_play"
+
+    stats = calcs.solve_model(model)
+    # A set-up with no seat of the character's own role type can't have it in play (e.g. the Hermit at a
+    # table with no Outsiders), so the solve should fail
+    expected = expected_counts[name](base_counts)
+    seatable = any(counts[characters.loc[j, 'role_type']] > 0 for counts in expected)
+    if not seatable:
+        problems = [] if stats['status'] != "Optimal" else [f"seed {seed}: solved, but no set-up has a seat for {name}"]
+        return problems, stats['solve_time']
+    if stats['status'] != "Optimal":
+        return [f"seed {seed}: {stats['status']}"], stats['solve_time']
+
+    result = calcs.summarise_solution(model, problem, stats, seed)
+    problems = []
+    seated = [i for i, _ in result.pairs]
+    if sorted(seated) != list(range(len(x))):
+        problems.append(f"seed {seed}: players seated {sorted(seated)}")
+
+    # Role counts as the MILP enforced them (seats that count as another role type are already relabelled,
+    # the post-solve hooks only relabel copies)
+    in_play = characters.loc[[j for _, j in result.pairs]]
+    counts = {role_type: int((in_play['role_type'] == role_type).sum()) for role_type in ROLE_TYPES}
+    if counts not in expected:
+        problems.append(f"seed {seed}: role counts {counts}, expected one of {expected}")
+    # The requirements reported with the assignment must describe the characters actually seated
+    enforced = {role_type: result.adjusted_requirements.get(role_type, base_counts[role_type]) for role_type in ROLE_TYPES}
+    if enforced != counts:
+        problems.append(f"seed {seed}: enforced role counts {enforced}, seated {counts}")
+    for companion in companions[name]:
+        if companion.lower() not in set(in_play['name'].str.lower()):
+            problems.append(f"seed {seed}: {companion} not in play")
+    return problems, stats['solve_time']
+
+
+## Rejects one assignment and rerolls (as the interactive set-up does after an "N"): the MILP reroll is
+## warm-started from the rejected assignment and must not bring it back. Returns (problems, pruned columns).
+def run_reroll(problem, seed, engine):
+    compiled = rules.compile_rules(problem['characters'], problem['player_requirements'])
+    pruned = formulation.prunable_columns(problem['characters'], compiled['role_limits'])
+
+    first = calcs.generate_assignment(problem, seed, engine=engine)
+    if not first.solved:
+        return [f"seed {seed}: {first.stats['status']}"], len(pruned)
+    try:
+        second = calcs.generate_assignment(problem, seed + 1, engine=engine, rejected=[first.choices])
+    except Exception as e:
+        return [f"seed {seed}: reroll failed with {type(e).__name__}: {e}"], len(pruned)
+    if not second.solved:
+        return [f"seed {seed}: reroll {second.stats['status']}"], len(pruned)
+    if engine != "two_stage" and set(second.choices) == set(first.choices):
+        return [f"seed {seed}: the reroll brought back the rejected assignment"], len(pruned)
+    return [], len(pruned)
+
+
+## Seats the Lord of Typhon at a table entered in an order that isn't alphabetical: the players either side
+## of it in that order, not its neighbours by name, must be the ones playing Evil. Returns the problems found.
+def run_seating(problem, seating, seed, engine):
+    rng = np.random.default_rng(seed)
+    if problem['players']['name'].tolist() != seating:
+        return [f"seed {seed}: players loaded as {problem['players']['name'].tolist()}, entered as {seating}"]
+    problem = calcs.shuffled_problem(problem, rng)
+    characters = problem['characters']
+    model = calcs.build_model(problem, rng, engine=engine)
+    x = model['x']
+    j = characters.index[characters['name'].str.lower() == seating_character.lower()][0]
+    model['prob'] += lpSum(x[i][j] for i in range(len(x))) == 1, "force_in_play"
+    stats = calcs.solve_model(model)
+    if stats['status'] != "Optimal":
+        return [f"seed {seed}: {stats['status']}"]
+
+    result = calcs.summarise_solution(model, problem, stats, seed)
+    teams = dict(zip(result.assignment['player'], result.assignment['team']))
+    lord = [player for player, character in zip(result.assignment['player'], result.assignment['character'])
+            if character.lower() == seating_character.lower()][0]
+    seat = seating.index(lord)
+    neighbours = [seating[(seat - 1) % len(seating)], seating[(seat + 1) % len(seating)]]
+    return [f"seed {seed}: {neighbour}, next to {lord}, plays {teams[neighbour]}"
+            for neighbour in neighbours if teams[neighbour] != "Evil"]
+
+
+def check_seating(sizes, engine=calcs.ENGINE, seeds=3):
+    import io
+    import contextlib
+
+    failures = 0
+    print(f"\n{'seating':<16}{'players':>8}{'':>22}  result")
+    for num_players in sizes:
+        names = [f"Player{i}" for i in range(1, num_players + 1)]
+        # Every other player round the table, so no one sits next to their neighbour by name
+        seating = names[::2] + names[1::2]
+        with contextlib.redirect_stdout(io.StringIO()):
+            problem = calcs.load_problem(f"Regression_{seating_character}", seating)
+            problems = [found for seed in range(seeds) for found in run_seating(problem, seating, seed, engine)]
+        failures += bool(problems)
+        print(f"{seating_character:<16}{num_players:>8}{'':>22}  {'FAIL' if problems else 'ok'}")
+        for problem in problems:
+            print(f"{'':<18}{problem}")
+    return failures
+
+
+def check_rerolls(sizes, engine=calcs.ENGINE, seeds=3):
+    import io
+    import contextlib
+
+    failures = 0
+    print(f"\n{'reroll':<16}{'players':>8}{'pruned':>12}{'':>10}  result")
+    for num_players in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            problem = calcs.load_problem(f"Regression_{reroll_character}", [f"Player{i}" for i in range(1, num_players + 1)])
+        problems = []
+        for seed in range(seeds):
+            seed_problems, pruned = run_reroll(problem, seed, engine)
+            problems += seed_problems
+        failures += bool(problems)
+        print(f"{reroll_character:<16}{num_players:>8}{pruned:>12}{'':>10}  {'FAIL' if problems else 'ok'}")
+        for problem in problems:
+            print(f"{'':<18}{problem}")
+    return failures
+
+
+def check_constraints(names=None, engine=calcs.ENGINE, seeds=3, save_baseline=False):
+    import io
+    import contextlib
+
+    con = fixture_connection()
+    db_setup.db_path = ":memory:"
+    sizes = table_sizes(con)
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as handle:
+            baseline = json.load(handle)
+
+    latencies = {}
+    failures = 0
+    print(f"{'character':<16}{'players':>8}{'solve (ms)':>12}{'baseline':>10}  result")
+    for name in names or character_constraints:
+        with contextlib.redirect_stdout(io.StringIO()):
+            problems = {num_players: calcs.load_problem(f"Regression_{name}", [f"Player{i}" for i in range(1, num_players + 1)])
+                        for num_players in sizes}
+        if not any(name.lower() in set(problem['characters']['name'].str.lower()) for problem in problems.values()):
+            failures += 1
+            print(f"{name:<16}{'-':>8}{'-':>12}{'-':>10}  FAIL")
+            print(f"{'':<18}no character named '{name}' in the characters table, so the rule never applies")
+            continue
+        for num_players, base_counts in sizes.items():
+            case = f"{engine}:{name}:{num_players}"
+            case_problems, timings = [], []
+            for seed in range(seeds):
+                seed_problems, solve_time = run_case(problems[num_players], name, base_counts, seed, engine)
+                case_problems += seed_problems
+                timings.append(solve_time)
+            latencies[case] = statistics.median(timings)
+
+            previous = baseline.get(case)
+            slower = previous is not None and latencies[case] > 2 * previous + 0.05
+            failures += bool(case_problems) or slower
+            status = "FAIL" if case_problems else ("SLOWER" if slower else "ok")
+            shown = f"{previous * 1000:.1f}" if previous is not None else "-"
+            print(f"{name:<16}{num_players:>8}{latencies[case] * 1000:>12.1f}{shown:>10}  {status}")
+            for problem in case_problems:
+                print(f"{'':<18}{problem}")
+
+    if names is None:
+        failures += check_seating(sizes, engine, seeds)
+        failures += check_rerolls(sizes, engine, seeds)
+
+    if save_baseline:
+        baseline.update(latencies)
+        with open(baseline_path, "w") as handle:
+            json.dump(baseline, handle, indent=1, sort_keys=True)
+        print(f"Saved latency baseline to {baseline_path}")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    engine = calcs.ENGINE
+    seeds = 3
+    if "--engine" in args:
+        engine = args.pop(args.index("--engine") + 1)
+        args.remove("--engine")
+    if "--seeds" in args:
+        seeds = int(args.pop(args.index("--seeds") + 1))
+        args.remove("--seeds")
+    save = "--save-baseline" in args
+    if save:
+        args.remove("--save-baseline")
+    ok = check_constraints(args or None, engine, seeds, save)
+    sys.exit(0 if ok else 1)
@@ -1,3 +1,176 @@
 import os
+import atexit
+import sqlite3
+import threading
 script_dir = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(script_dir, "clocktower.db")
+
+# Compiled statements kept per connection, so repeated queries skip re-preparing
+STATEMENT_CACHE_SIZE = 256
+
+# Number of recent results kept per player (teams) and per character (wins) in the aggregate tables
+AGGREGATE_WINDOW = 10
+
+# Recomputes the aggregate tables (see aggregates.py) from the raw assignments history
+aggregate_backfill = f"""
+    DELETE FROM player_alignment_stats;
+    DELETE FROM player_character_stats;
+    DELETE FROM character_stats;
+    DELETE FROM player_recent_teams;
+    DELETE FROM character_recent_results;
+
+    INSERT INTO player_alignment_stats (player_id, team, games, wins)
+    SELECT player_id, team, COUNT(*), SUM(won)
+    FROM assignments
+    GROUP BY player_id, team;
+
+    INSERT INTO player_character_stats (player_id, character_id, team, games, wins)
+    SELECT player_id, character_id, team, COUNT(*), SUM(won)
+    FROM assignments
+    GROUP BY player_id, character_id, team;
+
+    INSERT INTO character_stats (character_id, games, wins)
+    SELECT character_id, COUNT(*), SUM(won)
+    FROM assignments
+    GROUP BY character_id;
+
+    INSERT INTO player_recent_teams (player_id, slot, assignment_id, team)
+    SELECT player_id, (position - 1) % {AGGREGATE_WINDOW}, assignment_id, team
+    FROM (
+        SELECT player_id, assignment_id, team,
+               ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY assignment_id) AS position,
+               COUNT(*) OVER (PARTITION BY player_id) AS total
+        FROM assignments
+    )
+    WHERE position > total - {AGGREGATE_WINDOW};
+
+    INSERT INTO character_recent_results (character_id, slot, assignment_id, game_id, won)
+    SELECT character_id, (position - 1) % {AGGREGATE_WINDOW}, assignment_id, game_id, won
+    FROM (
+        SELECT character_id, assignment_id, game_id, won,
+               ROW_NUMBER() OVER (PARTITION BY character_id ORDER BY game_id, assignment_id) AS position,
+               COUNT(*) OVER (PARTITION BY character_id) AS total
+        FROM assignments
+    )
+    WHERE position > total - {AGGREGATE_WINDOW};
+"""
+
+# Schema changes applied to existing databases, in order; PRAGMA user_version records how many have run
+migrations = [
+    # 1: model fit cache (see model_fit.get_model_fit)
+    """
+    CREATE TABLE IF NOT EXISTS model_fits (
+        fingerprint TEXT PRIMARY KEY,
+        weighted_elo REAL NOT NULL,
+        weighted_strength REAL NOT NULL,
+        intercept REAL NOT NULL
+    );
+    """,
+    # 2: indexes for the hot queries, and one row per character per script
+    """
+    DELETE FROM script_characters
+    WHERE rowid NOT IN (SELECT MIN(rowid) FROM script_characters GROUP BY script_id, character_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_script_characters_script_character ON script_characters (script_id, character_id);
+    CREATE INDEX IF NOT EXISTS idx_assignments_player ON assignments (player_id, assignment_id);
+    CREATE INDEX IF NOT EXISTS idx_assignments_character ON assignments (character_id, game_id);
+    CREATE INDEX IF NOT EXISTS idx_assignments_game ON assignments (game_id, player_id);
+    CREATE INDEX IF NOT EXISTS idx_players_name ON players (name);
+    CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name);
+    CREATE INDEX IF NOT EXISTS idx_scripts_name ON scripts (name);
+    """,
+    # 3: aggregate tables maintained by aggregates.record_assignment, backfilled from the history
+    """
+    CREATE TABLE IF NOT EXISTS player_alignment_stats (
+        player_id INTEGER NOT NULL,
+        team TEXT NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        PRIMARY KEY (player_id, team)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS player_character_stats (
+        player_id INTEGER NOT NULL,
+        character_id INTEGER NOT NULL,
+        team TEXT NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        PRIMARY KEY (player_id, character_id, team)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS character_stats (
+        character_id INTEGER NOT NULL PRIMARY KEY,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS player_recent_teams (
+        player_id INTEGER NOT NULL,
+        slot INTEGER NOT NULL,
+        assignment_id INTEGER NOT NULL,
+        team TEXT NOT NULL,
+        PRIMARY KEY (player_id, slot)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS character_recent_results (
+        character_id INTEGER NOT NULL,
+        slot INTEGER NOT NULL,
+        assignment_id INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        won INTEGER NOT NULL,
+        PRIMARY KEY (character_id, slot)
+    ) WITHOUT ROWID;
+    """ + aggregate_backfill,
+    # 4: each player's ratings after every game they played (see elo.py); game 0 rows are starting ratings.
+    # Filled by eloUpdate from here on, and for the existing history by elo.replay_ratings()
+    """
+    CREATE TABLE IF NOT EXISTS rating_snapshots (
+        player_id INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        elo_good REAL NOT NULL,
+        elo_evil REAL NOT NULL,
+        PRIMARY KEY (player_id, game_id)
+    ) WITHOUT ROWID;
+    """,
+]
+
+
+## Brings an existing database up to date with the migrations above
+def migrate(con):
+    # Nothing to migrate until DB SCHEMA.sql has been loaded
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'assignments'").fetchone() is None:
+        return
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    for number in range(version, len(migrations)):
+        # Each migration and its version bump commit together
+        con.executescript("BEGIN;" + migrations[number] + f"PRAGMA user_version = {number + 1};COMMIT;")
+
+
+# One long-lived connection per thread and database file (sqlite3 connections are not shareable across threads)
+_local = threading.local()
+
+
+## Returns this thread's shared connection, opening and tuning it on first use
+def get_connection(path=None):
+    path = path or db_path
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    con = connections.get(path)
+    if con is None:
+        con = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")     # safe with WAL, avoids an fsync per commit
+        con.execute("PRAGMA cache_size = -20000")      # ~20 MB page cache, kept warm between calls
+        con.execute("PRAGMA temp_store = MEMORY")
+        con.execute("PRAGMA mmap_size = 268435456")
+        migrate(con)
+        connections[path] = con
+    return con
+
+
+## Closes this thread's connections (checkpoints the WAL on the way out)
+def close_connections():
+    connections = getattr(_local, "connections", {})
+    for con in connections.values():
+        con.close()
+    connections.clear()
+
+
+atexit.register(close_connections)
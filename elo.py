@@ -0,0 +1,202 @@
+## ELO RATINGS ##
+# The Elo update used after every game, plus a replay engine that recomputes every player's good/evil
+# rating from the whole games history in one pass. Each game's new ratings are kept in rating_snapshots
+# (created by the db_setup migrations), so ratings can be looked up "as of game N" and re-rated after a
+# K factor change or a corrected result with replay_ratings(). rate_new_games() rates a batch of games
+# appended to the history (a bulk import) in one pass.
+import time
+import numpy as np
+import db_setup
+
+# Elo update factor, and the rating a player starts on (also the average of a team nobody played on)
+ELO_K = 24
+ELO_FALLBACK = 1500
+
+# Assignment rows fetched per block while streaming the history
+FETCH_BLOCK = 50_000
+
+
+## New ratings for everyone in one or more games at once. game, good, won and the ratings are per-player
+## arrays, game numbering the games 0..n-1 (no player may be in two of them). Each player is rated against
+## the other team's average in their game (taken before anyone is updated) on the side they played.
+## Returns the new rating on that side, truncated to a whole number.
+def elo_after_games(game, good, won, elo_good, elo_evil, k=ELO_K):
+    num_games = int(game.max()) + 1 if len(game) else 0
+    player_elo = np.where(good, elo_good, elo_evil)
+
+    # Team totals per (game, side) in one pass; a side nobody played on averages ELO_FALLBACK
+    team = 2 * game + good
+    totals = np.bincount(team, weights=player_elo, minlength=2 * num_games)
+    counts = np.bincount(team, minlength=2 * num_games)
+    averages = np.full(2 * num_games, float(ELO_FALLBACK))
+    np.divide(totals, counts, out=averages, where=counts > 0)
+
+    # Good players face the Evil average (slot 2g) and Evil players the Good average (slot 2g + 1)
+    opponent_elo = averages[2 * game + ~good]
+    expected_score = 1 / (1 + 10 ** ((opponent_elo - player_elo) / 400))
+    return np.trunc(player_elo + k * (won - expected_score))
+
+
+## Streams the Good/Evil assignments (from game first_game_id on) into arrays in game order
+## (game ids, player ids, is good, won)
+def _history_arrays(cur, first_game_id=0):
+    # A plain table scan, sorted by game here; order within a game doesn't matter as the averages are
+    # taken before the update
+    cur.execute("""
+    SELECT game_id, player_id, team = 'Good', won
+    FROM assignments
+    WHERE team IN ('Good', 'Evil') AND game_id >= ?;
+    """, (first_game_id,))
+    blocks = []
+    while True:
+        rows = cur.fetchmany(FETCH_BLOCK)
+        if not rows:
+            break
+        blocks.append(np.array(rows, dtype=np.int64))
+    history = np.concatenate(blocks) if blocks else np.empty((0, 4), dtype=np.int64)
+    history = history[np.argsort(history[:, 0], kind='stable')]
+    return history[:, 0], history[:, 1], history[:, 2].astype(bool), history[:, 3].astype(float)
+
+
+## Splits the game-ordered rows into runs of consecutive games in which no player appears twice; the games
+## in a run don't depend on each other, so each run is rated in one vectorised step. Returns row bounds.
+def _independent_runs(game_ids, slot):
+    game_starts = np.concatenate([[0], np.flatnonzero(np.diff(game_ids)) + 1])
+    # Row of each player's previous appearance (-1 for their first game)
+    order = np.argsort(slot, kind='stable')
+    previous = np.full(len(slot), -1)
+    repeat = slot[order][1:] == slot[order][:-1]
+    previous[order[1:][repeat]] = order[:-1][repeat]
+    latest_previous = np.maximum.reduceat(previous, game_starts) if len(slot) else previous
+
+    runs = [0]
+    for game_start, depends_on in zip(game_starts.tolist(), latest_previous.tolist()):
+        if depends_on >= runs[-1]:
+            runs.append(game_start)
+    return runs + [len(slot)]
+
+
+## Rates the game-ordered rows in order, updating elo_good/elo_evil (indexed by slot) in place.
+## Returns every row's ratings after its game and the number of games.
+def _rate_history(game_ids, slot, good, won, elo_good, elo_evil, k):
+    game_number = np.concatenate([[0], np.cumsum(np.diff(game_ids) != 0)]) if len(game_ids) else game_ids
+    snapshot_good = np.empty(len(game_ids))
+    snapshot_evil = np.empty(len(game_ids))
+    runs = _independent_runs(game_ids, slot)
+    for first, last in zip(runs[:-1], runs[1:]):
+        seats = slot[first:last]
+        side = good[first:last]
+        new_elo = elo_after_games(game_number[first:last] - game_number[first], side, won[first:last],
+                                  elo_good[seats], elo_evil[seats], k)
+        elo_good[seats[side]] = new_elo[side]
+        elo_evil[seats[~side]] = new_elo[~side]
+        snapshot_good[first:last] = elo_good[seats]
+        snapshot_evil[first:last] = elo_evil[seats]
+    return snapshot_good, snapshot_evil, int(game_number[-1]) + 1 if len(game_ids) else 0
+
+
+## Writes the rows' snapshots and the players' ratings in one transaction (caller deletes stale snapshots)
+def _write_ratings(con, game_ids, player_ids, snapshot_good, snapshot_evil, players, elo_good, elo_evil, write_players):
+    cur = con.cursor()
+    # Inserted in primary key order, which keeps the WITHOUT ROWID b-tree appends cheap
+    key_order = np.lexsort((game_ids, player_ids))
+    cur.executemany("INSERT OR REPLACE INTO rating_snapshots (player_id, game_id, elo_good, elo_evil) VALUES(?, ?, ?, ?)",
+                    zip(player_ids[key_order].tolist(), game_ids[key_order].tolist(),
+                        snapshot_good[key_order].tolist(), snapshot_evil[key_order].tolist()))
+    if write_players:
+        cur.executemany("UPDATE players SET elo_good = ?, elo_evil = ? WHERE player_id = ?",
+                        zip(elo_good.tolist(), elo_evil.tolist(), players.tolist()))
+    con.commit()
+
+
+## Recomputes every rating from the start of the history with factor k. Players start on their game 0
+## snapshot if they have one, otherwise on ELO_FALLBACK. Rewrites rating_snapshots and, if write_players,
+## the players' current ratings, in one transaction. Returns (games, players, seconds).
+def replay_ratings(k=ELO_K, write_players=True):
+    from model_fit import clear_model_fits
+
+    start = time.perf_counter()
+    con = db_setup.get_connection()
+    cur = con.cursor()
+    game_ids, player_ids, good, won = _history_arrays(cur)
+
+    # Array-backed state: one slot per player in the history
+    players, slot = np.unique(player_ids, return_inverse=True)
+    elo_good = np.full(len(players), float(ELO_FALLBACK))
+    elo_evil = np.full(len(players), float(ELO_FALLBACK))
+    cur.execute("SELECT player_id, elo_good, elo_evil FROM rating_snapshots WHERE game_id = 0")
+    for player_id, start_good, start_evil in cur.fetchall():
+        position = np.searchsorted(players, player_id)
+        if position < len(players) and players[position] == player_id:
+            elo_good[position], elo_evil[position] = start_good, start_evil
+
+    # Every assignment row gets the player's ratings after that game
+    snapshot_good, snapshot_evil, games = _rate_history(game_ids, slot, good, won, elo_good, elo_evil, k)
+    try:
+        cur.execute("DELETE FROM rating_snapshots WHERE game_id > 0")
+        _write_ratings(con, game_ids, player_ids, snapshot_good, snapshot_evil, players, elo_good, elo_evil, write_players)
+    except Exception as e:
+        print(f"Elo replay failed: {e}")
+        con.rollback()
+        raise
+    if write_players:
+        clear_model_fits()  # the fits were made on the old ratings
+    return games, len(players), time.perf_counter() - start
+
+
+## Rates the games from first_game_id on (e.g. a bulk import appended to the history) in one batch,
+## starting from the players' current ratings, as if eloUpdate had run after each of them in turn.
+## Writes their snapshots and the new ratings in one transaction. Returns (games, players, seconds).
+def rate_new_games(first_game_id, k=ELO_K):
+    from model_fit import clear_model_fits
+
+    start = time.perf_counter()
+    con = db_setup.get_connection()
+    cur = con.cursor()
+    game_ids, player_ids, good, won = _history_arrays(cur, first_game_id)
+
+    players, slot = np.unique(player_ids, return_inverse=True)
+    cur.execute("SELECT player_id, elo_good, elo_evil FROM players WHERE player_id IN ({})".format(
+        ','.join(['?'] * len(players))), players.tolist())
+    current = {player_id: (elo_good, elo_evil) for player_id, elo_good, elo_evil in cur.fetchall()}
+    elo_good = np.array([current.get(player_id, (ELO_FALLBACK, ELO_FALLBACK))[0] for player_id in players.tolist()], dtype=float)
+    elo_evil = np.array([current.get(player_id, (ELO_FALLBACK, ELO_FALLBACK))[1] for player_id in players.tolist()], dtype=float)
+
+    snapshot_good, snapshot_evil, games = _rate_history(game_ids, slot, good, won, elo_good, elo_evil, k)
+    try:
+        cur.execute("DELETE FROM rating_snapshots WHERE game_id >= ?", (first_game_id,))
+        _write_ratings(con, game_ids, player_ids, snapshot_good, snapshot_evil, players, elo_good, elo_evil, True)
+    except Exception as e:
+        print(f"Elo update failed: {e}")
+        con.rollback()
+        raise
+    clear_model_fits()  # the fits were made on the old ratings
+    return games, len(players), time.perf_counter() - start
+
+
+## Each player's (elo_good, elo_evil) as they stood after game game_id: their latest snapshot up to that
+## game, or ELO_FALLBACK for a player who hadn't played by then. Raises ValueError if a player played
+## before then but has no snapshot (a history from before rating_snapshots existed; run replay_ratings()).
+def ratings_as_of(cur, player_ids, game_id):
+    cur.execute("""
+    SELECT DISTINCT player_id
+    FROM assignments
+    WHERE player_id IN ({}) AND game_id <= ? AND team IN ('Good', 'Evil')
+    AND NOT EXISTS (SELECT 1 FROM rating_snapshots AS snapshot
+                    WHERE snapshot.player_id = assignments.player_id AND snapshot.game_id BETWEEN 1 AND ?);
+    """.format(','.join(['?'] * len(player_ids))), tuple(player_ids) + (game_id, game_id))
+    unrated = [row[0] for row in cur.fetchall()]
+    if unrated:
+        raise ValueError(f"No rating snapshots up to game {game_id} for players {unrated}; "
+                         f"run elo.replay_ratings() to rate the existing history")
+
+    query = """
+    SELECT player_id, elo_good, elo_evil
+    FROM rating_snapshots AS snapshot
+    WHERE player_id IN ({})
+    AND game_id = (SELECT MAX(game_id) FROM rating_snapshots
+                   WHERE player_id = snapshot.player_id AND game_id <= ?);
+    """.format(','.join(['?'] * len(player_ids)))
+    cur.execute(query, tuple(player_ids) + (game_id,))
+    ratings = {player_id: (elo_good, elo_evil) for player_id, elo_good, elo_evil in cur.fetchall()}
+    return {player_id: ratings.get(player_id, (ELO_FALLBACK, ELO_FALLBACK)) for player_id in player_ids}
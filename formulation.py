@@ -0,0 +1,112 @@
+## FORMULATION ##
+# Builds the character assignment MILP. Columns are grouped by role type and alignment up front and
+# every row is built with PuLP's bulk LpAffineExpression constructor from its non-zero terms only,
+# instead of lpSum over the full players x characters grid.
+from pulp import LpProblem, LpVariable, LpMinimize, LpBinary, LpAffineExpression, LpConstraint
+from pulp import LpConstraintEQ, LpConstraintLE
+
+ROLE_TYPES = ['Townsfolk', 'Outsider', 'Minion', 'Demon']
+
+
+## Column indices of the characters in each role type and alignment
+def column_groups(characters):
+    role_types = characters['role_type'].values
+    alignments = characters['alignment'].values
+    roles = {role_type: [j for j in range(len(characters)) if role_types[j] == role_type] for role_type in ROLE_TYPES}
+    teams = {team: [j for j in range(len(characters)) if alignments[j] == team] for team in ['Good', 'Evil']}
+    return roles, teams
+
+
+## Characters that can never be in play: at most 0 of their role type can be in play. role_limits is the
+## most of each role type any set-up allows (the base requirements, or character_constraints' role_limits)
+def prunable_columns(characters, role_limits):
+    roles, _ = column_groups(characters)
+    return {j for role_type, columns in roles.items() if role_limits.get(role_type, 0) == 0 for j in columns}
+
+
+## Creates the problem and the x[i][j] grid; pruned cells are the constant 0 rather than a variable
+def create_grid(num_players, num_characters, pruned=()):
+    prob = LpProblem("CharacterAssignment", LpMinimize)
+    x = [[0 if j in pruned else LpVariable(f"x_{i}_{j}", cat=LpBinary) for j in range(num_characters)]
+         for i in range(num_players)]
+    return prob, x
+
+
+## Sum of x over the given cells with the given coefficients, skipping zero coefficients and cells that
+## aren't variables (pruned cells, and the empty rows of a two-stage selection grid)
+def grid_expression(x, cells, coefficients=None):
+    terms = []
+    for k, (i, j) in enumerate(cells):
+        coefficient = 1 if coefficients is None else coefficients[k]
+        if coefficient != 0 and isinstance(x[i][j], LpVariable):
+            terms.append((x[i][j], coefficient))
+    return LpAffineExpression(terms)
+
+
+## Each player gets exactly one character, each character goes to at most one player
+def add_assignment_rows(prob, x):
+    num_players = len(x)
+    num_characters = len(x[0]) if x else 0
+    for i in range(num_players):
+        prob.addConstraint(LpConstraint(grid_expression(x, [(i, j) for j in range(num_characters)]), LpConstraintEQ, rhs=1))
+    for j in range(num_characters):
+        column = grid_expression(x, [(i, j) for i in range(num_players)])
+        if len(column):
+            prob.addConstraint(LpConstraint(column, LpConstraintLE, rhs=1))
+
+
+## Number of characters of a role type in play equals its (possibly variable) adjusted requirement
+def add_role_rows(prob, x, roles, adjusted_requirements, player_requirements):
+    for role_type in ROLE_TYPES:
+        role_count = grid_expression(x, [(i, j) for i in range(len(x)) for j in roles[role_type]])
+        required_count = adjusted_requirements.get(role_type, player_requirements[role_type])
+        prob += role_count == required_count
+
+
+## Team balance rows (with tolerance) and the objective; returns the excess imbalance variable
+## extra_objective is added as is (e.g. the character rules' option weights), and balance_adjustment to
+## av_good - av_evil (e.g. seats a character rule turns Evil)
+def add_balance_and_objective(prob, x, S, B, noise, teams, tolerance=1.0, column_penalties=None, extra_objective=None,
+                              balance_adjustment=None):
+    num_players = len(x)
+    num_good = len(teams['Good']) or 1
+    num_evil = len(teams['Evil']) or 1
+
+    # av_good - av_evil as one expression
+    good_cells = [(i, j) for i in range(num_players) for j in teams['Good']]
+    evil_cells = [(i, j) for i in range(num_players) for j in teams['Evil']]
+    balance = grid_expression(x, good_cells + evil_cells,
+                              [S[i][j] / num_good for i, j in good_cells] + [-S[i][j] / num_evil for i, j in evil_cells])
+    if balance_adjustment is not None:
+        balance += balance_adjustment
+
+    excess = LpVariable("excess_imbalance", lowBound=0)
+    prob += balance - excess <= tolerance
+    prob += -balance - excess <= tolerance
+
+    # excess - bias + noise (+ any per-character penalty) in one pass over the grid
+    column_penalties = column_penalties or {}
+    cells = [(i, j) for i in range(num_players) for j in range(len(x[i]))]
+    objective = grid_expression(x, cells, [noise[i][j] - B[i][j] + column_penalties.get(j, 0) for i, j in cells])
+    objective.addterm(excess, 1)
+    if extra_objective is not None:
+        objective += extra_objective
+    prob += objective
+    return excess
+
+
+## Team balance (av_good - av_evil) of a solved set of (player, character) pairs; pairs in turned_evil play
+## Evil although their character is Good (e.g. the Lord of Typhon's neighbours)
+def pair_balance(pairs, S, teams, turned_evil=()):
+    num_good = len(teams['Good']) or 1
+    num_evil = len(teams['Evil']) or 1
+    turned_evil = set(turned_evil)
+    good = set(teams['Good'])
+    evil = set(teams['Evil'])
+    return (sum(S[i][j] for i, j in pairs if j in good and (i, j) not in turned_evil) / num_good -
+            sum(S[i][j] for i, j in pairs if j in evil or (i, j) in turned_evil) / num_evil)
+
+
+## How far a solved set of pairs is outside the balance tolerance (the value of the excess variable)
+def excess_imbalance(pairs, S, teams, tolerance=1.0, turned_evil=()):
+    return max(0.0, abs(pair_balance(pairs, S, teams, turned_evil)) - tolerance)
@@ -1,10 +1,9 @@
 ## MAIN PROGRAM ##
 
-import sqlite3
+import importlib
 import db_setup
+import name_index
 
-from calcs import assignments
-from post_game_data_collection import dataCollection
 from new_script import addScript
 
 
@@ -16,31 +15,10 @@ def setup():
     while no_script == True:
         script = str(input("Enter the name of a script or 'custom' or 'random':   "))
 
-        words = script.strip().split()
-        for i in range(0,len(words)):
-            if i == 0:
-                script = words[i].capitalize()
-            elif 1 <= i and i < len(words):
-                script += "_" + words[i].lower()
-            else:
-                script += words[i].lower()
-
-        try:
-            con = sqlite3.connect(db_setup.db_path) 
-            cur = con.cursor() 
-        except Exception as e:
-            print(f'An error occurred: {e}.')
-            exit()
-        query = """
-        SELECT *
-        FROM scripts
-        WHERE name = ?
-        """
+        script = name_index.script_key(script)
         print(script)
-        cur.execute(query, (script,))
-        script_exists = cur.fetchall()
-        con.close()
-        if script_exists == []:
+        script_exists = name_index.script(script)
+        if script_exists is None:
             print("Script", script, "does not exist")
             add = str(input("Add " + script + " into the database?   ")).lower()
             if add == "yes" or add == "y":
@@ -48,6 +26,8 @@ def setup():
                 no_script = False
             
         else:
+            # load_problem and script_bundles match names exactly, so the game gets the name as stored
+            script = name_index.script_name(script)
             no_script = False
 
 
@@ -64,35 +44,28 @@ def setup():
             players = de
             inputting = False
         else:
-            if player in players:
+            # load_problem matches names exactly, so the game gets the name as stored
+            stored_name = name_index.player_name(player)
+            if stored_name is not None and stored_name in players:
                 print("Player already in game")
+            elif stored_name is not None:
+                players.append(stored_name)
             else:
-                try:
-                    con = sqlite3.connect(db_setup.db_path)  
-                    cur = con.cursor() 
-                except Exception as e:
-                    print(f'An error occurred: {e}.')
-                    exit()
-                query = """
-                SELECT *
-                FROM players
-                WHERE name = ?
-                """
-                cur.execute(query, (player,))
-                player_exists = cur.fetchall()
-                con.close()
-                print(player_exists)
-                if player_exists != []:
-                    players.append(player)
-                else:
-                    print("Player", player, "does not exist")
-                    add = str(input("Add " + player + " into database?   ")).lower()
-                    if add == "y" or add == "yes":
-                        addPlayer(player)
+                print("Player", player, "does not exist")
+                add = str(input("Add " + player + " into database?   ")).lower()
+                if add == "y" or add == "yes":
+                    addPlayer(player)
                     
                     
 
-    assignments(script, players)
+    # calcs pulls in numpy/pandas/pulp, so it's only loaded once a game is set up
+    batch = str(input("How many assignments to show at once? (Enter for one at a time)   ")).strip()
+    if batch.isdigit() and int(batch) > 1:
+        from calcs import choose_assignment
+        choose_assignment(script, players, int(batch))
+    else:
+        from calcs import assignments
+        assignments(script, players)
     return players
 
 
@@ -101,7 +74,7 @@ def addPlayer(player=None):
     if player == None:
         player = str(input("Enter player name:   ")).capitalize()
     try:
-        con = sqlite3.connect(db_setup.db_path) 
+        con = db_setup.get_connection()
         cur = con.cursor() 
     except Exception as e:
         print(f'An error occurred: {e}.')
@@ -112,15 +85,36 @@ def addPlayer(player=None):
     """
     cur.execute(query, (player,))
     con.commit() 
-    con.close()
+    name_index.add_player(player, cur.lastrowid)
     print("Player", player, "was added")
 
 
 ## Adds the game results into the database
 def gameResults():
+    from post_game_data_collection import dataCollection
     dataCollection()
 
 
+# Menu options -> (module, function); modules are only imported once their option is chosen
+menu_options = {
+    "a": ("main", "setup"),
+    "b": ("post_game_data_collection", "dataCollection"),
+    "c": ("main", "addPlayer"),
+    "d": ("new_script", "addScript"),
+    "e": ("bulk_import", "importResults"),
+}
+
+
+## Imports whatever a menu option needs and returns its entry point
+def load_option(option):
+    module_name, function_name = menu_options[option]
+    if module_name == "main":
+        module = importlib.import_module(__name__)
+    else:
+        module = importlib.import_module(module_name)
+    return getattr(module, function_name)
+
+
 ## Main function 
 def main():
     in_menu = True
@@ -130,17 +124,12 @@ A = Set up game
 B = Add game results
 C = Add new player
 D = Add new script
+E = Import game results from a file
 X = Quit
     """))
 
-        if menu.lower() == "a":
-            setup()
-        elif menu.lower() == "b":
-            dataCollection()
-        elif menu.lower() == "c":
-            addPlayer()
-        elif menu.lower() == "d":
-            addScript()
+        if menu.lower() in menu_options:
+            load_option(menu.lower())()
         elif menu.lower() == "x":
             in_menu = False
         else:
@@ -148,4 +137,5 @@ X = Quit
     
 
 
-main()
+if __name__ == "__main__":
+    main()
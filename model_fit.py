@@ -0,0 +1,135 @@
+## MODEL FIT ##
+import hashlib
+import db_setup
+
+
+# Normal priors on (weighted_elo, weighted_strength, intercept), shared by every backend
+PRIOR_MU = (1.0, 1.0, 0.0)
+PRIOR_SIGMA = (3.0, 3.0, 1.0)
+
+# Default fitting backend; "pymc" is still available but has to be opted into
+FIT_BACKEND = "newton"
+
+
+## Number of games behind each row of game_data: aggregated rows carry a 'games' count, raw rows are one game each
+def _games(game_data):
+    if 'games' in game_data.columns:
+        return game_data['games'].values
+    return [1] * len(game_data)
+
+
+## MAP estimate by Newton's method (IRLS) with the Normal priors as an L2 penalty
+def _fit_newton(game_data, max_iter=50, tol=1e-10):
+    import numpy as np
+
+    X = np.column_stack([game_data['normalized_elo'].values.astype(float),
+                         game_data['normalized_strength'].values.astype(float),
+                         np.ones(len(game_data))])
+    y = game_data['won'].values.astype(float)
+    n = np.asarray(_games(game_data), dtype=float)
+    mu = np.array(PRIOR_MU)
+    precision = 1 / np.array(PRIOR_SIGMA) ** 2
+
+    beta = mu.copy()
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-(X @ beta)))
+        gradient = X.T @ (y - n * p) - precision * (beta - mu)
+        hessian = (X * (n * p * (1 - p))[:, None]).T @ X + np.diag(precision)
+        step = np.linalg.solve(hessian, gradient)
+        beta += step
+        if np.max(np.abs(step)) < tol:
+            break
+    return float(beta[0]), float(beta[1]), float(beta[2])
+
+
+## MAP estimate with PyMC (original implementation)
+def _fit_pymc(game_data):
+    import pymc as pm  # heavy import, only paid when this backend is selected
+
+    with pm.Model():
+        weighted_elo = pm.Normal('weighted_elo', mu=PRIOR_MU[0], sigma=PRIOR_SIGMA[0])
+        weighted_strength = pm.Normal('weighted_strength', mu=PRIOR_MU[1], sigma=PRIOR_SIGMA[1])
+        intercept = pm.Normal('intercept', mu=PRIOR_MU[2], sigma=PRIOR_SIGMA[2])
+
+        theta = pm.Data('theta', game_data['normalized_elo'].values)
+        phi   = pm.Data('phi',   game_data['normalized_strength'].values)
+
+        logits = (weighted_elo * theta) + (weighted_strength * phi) + intercept
+        p = pm.Deterministic('p', pm.math.sigmoid(logits))
+        pm.Binomial('outcome', n=_games(game_data), p=p, observed=game_data['won'].values)
+
+        map_estimate = pm.find_MAP(progressbar=False)
+
+    return (float(map_estimate['weighted_elo']),
+            float(map_estimate['weighted_strength']),
+            float(map_estimate['intercept']))
+
+
+# ----------------------------
+# Registry
+# ----------------------------
+fitters = {
+    "newton": _fit_newton,
+    "pymc": _fit_pymc,
+}
+
+
+## Fits the logistic win model (weighted_elo, weighted_strength, intercept) with the chosen backend
+def fit_logistic_model(game_data, backend=FIT_BACKEND):
+    if backend not in fitters:
+        raise ValueError(f"Unknown fit backend '{backend}', expected one of {sorted(fitters)}")
+    return fitters[backend](game_data)
+
+
+## Identifies the training data: the assignments history plus which players/characters it was filtered to
+def history_fingerprint(cur, player_ids, char_ids):
+    cur.execute("SELECT MAX(assignment_id) FROM assignments")
+    max_id = cur.fetchone()[0]
+    cur.execute("SELECT COALESCE(SUM(games), 0) FROM character_stats")  # row count, without counting assignments
+    row_count = cur.fetchone()[0]
+    ids = ",".join(map(str, sorted(set(player_ids)))) + "|" + ",".join(map(str, sorted(set(char_ids))))
+    return f"{max_id}:{row_count}:{hashlib.sha1(ids.encode()).hexdigest()}"
+
+
+## Returns the fitted parameters, reusing a cached fit if the history has not changed since.
+## as_of_game marks a fit made on the ratings as of an earlier game (see elo.ratings_as_of).
+def get_model_fit(game_data, player_ids, char_ids, backend=FIT_BACKEND, as_of_game=None):
+    try:
+        con = db_setup.get_connection()
+        cur = con.cursor()
+    except Exception as e:
+        print(f'An error occurred: {e}.')
+        return fit_logistic_model(game_data, backend)
+
+    fingerprint = backend + ":" + history_fingerprint(cur, player_ids, char_ids)
+    if as_of_game is not None:
+        fingerprint += f":as_of_{as_of_game}"
+    cur.execute("""
+    SELECT weighted_elo, weighted_strength, intercept
+    FROM model_fits
+    WHERE fingerprint = ?
+    """, (fingerprint,))
+    cached = cur.fetchone()
+    if cached is not None:
+        print("[Model] Reusing cached fit")
+        return cached
+
+    fit = fit_logistic_model(game_data, backend)
+    cur.execute("""
+    INSERT OR REPLACE INTO model_fits (fingerprint, weighted_elo, weighted_strength, intercept)
+    VALUES(?, ?, ?, ?);
+    """, (fingerprint,) + tuple(fit))
+    con.commit()
+    return fit
+
+
+## Drops every cached fit, called whenever new game results are inserted
+def clear_model_fits():
+    try:
+        con = db_setup.get_connection()
+        cur = con.cursor()
+    except Exception as e:
+        print(f'An error occurred: {e}.')
+        return
+    cur.execute("DELETE FROM model_fits")
+    con.commit()
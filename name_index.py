@@ -0,0 +1,153 @@
+## NAME INDEX ##
+# Every player, character and script name, loaded once per database into dicts keyed by the name as the
+# menus normalise it, with the rapidfuzz choice lists for autocorrect built alongside. Checking a typed
+# name is then a dict lookup and a suggestion needs no query. Code that adds players, scripts or script
+# characters updates the index with the add_ functions; invalidate() forces a reload (e.g. after the
+# database was edited by hand).
+import db_setup
+
+# Lowest rapidfuzz score (0-100) that still counts as a suggestion
+SUGGESTION_THRESHOLD = 60
+
+# Loaded indexes, per database file
+_indexes = {}
+
+
+## Names as the menus store them: "trouble brewing" -> Trouble_brewing, "liza" -> Liza, "scarlet woman" -> Scarlet Woman
+def script_key(name):
+    words = str(name).strip().split()
+    return "_".join([words[0].capitalize()] + [word.lower() for word in words[1:]]) if words else ""
+
+
+def player_key(name):
+    return str(name).strip().capitalize()
+
+
+def character_key(name):
+    return " ".join(word.capitalize() for word in str(name).split())
+
+
+## Names and their rapidfuzz-processed forms, ready for process.extractOne(..., processor=None)
+def _choices(names):
+    from rapidfuzz import utils
+
+    names = sorted(names)
+    return {'names': names, 'processed': [utils.default_process(name) for name in names]}
+
+
+## Reads every name from the database
+def _load(con):
+    cur = con.cursor()
+    cur.execute("SELECT player_id, name FROM players;")
+    player_rows = cur.fetchall()
+    players = {player_key(name): player_id for player_id, name in player_rows}
+    cur.execute("SELECT character_id, name, alignment, role_type FROM characters;")
+    characters = {character_key(name): (character_id, alignment, role_type)
+                  for character_id, name, alignment, role_type in cur.fetchall()}
+    cur.execute("SELECT script_id, name, type FROM scripts;")
+    script_rows = cur.fetchall()
+    scripts = {script_key(name): (script_id, script_type) for script_id, name, script_type in script_rows}
+    script_characters = {}
+    cur.execute("SELECT script_id, character_id FROM script_characters;")
+    for script_id, character_id in cur.fetchall():
+        script_characters.setdefault(script_id, set()).add(character_id)
+
+    return {
+        'players': players,
+        # Names exactly as stored, for queries that match on name (load_problem, script_bundles)
+        'player_names': {player_key(name): name for _, name in player_rows},
+        'characters': characters,
+        'scripts': scripts,
+        'script_names': {script_key(name): name for _, name, _ in script_rows},
+        'script_characters': script_characters,
+        'character_names': {character_id: name for name, (character_id, _, _) in characters.items()},
+        # Choice lists are built on first use and dropped when their names change
+        'choices': {},
+    }
+
+
+## The index for a database, loading it on first use
+def get_index(path=None):
+    path = path or db_setup.db_path
+    if path not in _indexes:
+        _indexes[path] = _load(db_setup.get_connection(path))
+    return _indexes[path]
+
+
+## Drops the loaded index so the next lookup reloads it
+def invalidate(path=None):
+    _indexes.pop(path or db_setup.db_path, None)
+
+
+def player_id(name, path=None):
+    return get_index(path)['players'].get(player_key(name))
+
+
+## The player's name as stored in the database, or None for an unknown player
+def player_name(name, path=None):
+    return get_index(path)['player_names'].get(player_key(name))
+
+
+## (character_id, alignment, role_type), or None for an unknown character
+def character(name, path=None):
+    return get_index(path)['characters'].get(character_key(name))
+
+
+## (script_id, type), or None for an unknown script
+def script(name, path=None):
+    return get_index(path)['scripts'].get(script_key(name))
+
+
+## The script's name as stored in the database, or None for an unknown script
+def script_name(name, path=None):
+    return get_index(path)['script_names'].get(script_key(name))
+
+
+def in_script(script_id, character_id, path=None):
+    return character_id in get_index(path)['script_characters'].get(script_id, ())
+
+
+def script_character_names(script_id, path=None):
+    index = get_index(path)
+    return [index['character_names'][character_id] for character_id in index['script_characters'].get(script_id, ())]
+
+
+## Closest known name to a misspelt one, or None if nothing scores threshold. kind is 'players',
+## 'characters' or 'scripts'; with script_id, characters are only matched against that script's.
+def suggest(kind, name, script_id=None, threshold=SUGGESTION_THRESHOLD, path=None):
+    # rapidfuzz is only imported once something needs correcting, which keeps the menu quick to start
+    from rapidfuzz import process, utils
+
+    index = get_index(path)
+    key = kind if script_id is None else (kind, script_id)
+    if key not in index['choices']:
+        names = script_character_names(script_id, path) if script_id is not None else index[kind]
+        index['choices'][key] = _choices(names)
+    choices = index['choices'][key]
+    match = process.extractOne(utils.default_process(str(name)), choices['processed'],
+                               processor=None, score_cutoff=threshold)
+    return choices['names'][match[2]] if match else None
+
+
+## Keep the index in step with rows just added (no-ops until it has been loaded)
+def add_player(name, new_player_id, path=None):
+    index = _indexes.get(path or db_setup.db_path)
+    if index is not None:
+        index['players'][player_key(name)] = new_player_id
+        index['player_names'][player_key(name)] = name
+        index['choices'].pop('players', None)
+
+
+def add_script(name, script_id, script_type, path=None):
+    index = _indexes.get(path or db_setup.db_path)
+    if index is not None:
+        index['scripts'][script_key(name)] = (script_id, script_type)
+        index['script_names'][script_key(name)] = name
+        index['choices'].pop('scripts', None)
+
+
+def add_script_characters(script_id, character_ids, path=None):
+    index = _indexes.get(path or db_setup.db_path)
+    if index is not None:
+        index['script_characters'].setdefault(script_id, set()).update(character_ids)
+        index['choices'].pop(('characters', script_id), None)
@@ -1,7 +1,7 @@
 ### NEW SCRIPT ###
 
-import sqlite3
 import db_setup
+import name_index
 ## Replace characters that are already in the script with another one
 def editChars(char_list, char_names, char):
     print("Characters:")
@@ -72,7 +72,7 @@ def forceChars(force_char_list, force_char_names, force_char, force_limit, orig_
 ## Ensures any scripts added contain the necessary limits for number of characters in certain roles
 def scriptRequirements(script_id, script_type):
     try:
-        con = sqlite3.connect(db_setup.db_path) 
+        con = db_setup.get_connection()
         cur = con.cursor() 
     except Exception as e:
         print(f'An error occurred: {e}.')
@@ -157,21 +157,14 @@ def scriptRequirements(script_id, script_type):
                                 not_done = False
                       
 
-        query = """
-        SELECT character_id, role_type
-        FROM characters
-        WHERE name = ?
-        """
-
-        cur.execute(query, (char,))
-        char_exists = cur.fetchall()
+        char_exists = name_index.character(char)
         if not_done and not_force:
-            if char_exists == []:
+            if char_exists is None:
                 print("Invalid character name")
                 continue
             
-            char_id = char_exists[0][0]
-            char_type = char_exists[0][1]
+            char_id = char_exists[0]
+            char_type = char_exists[2]
 
             if char_type == "Townsfolk":
                 if char_id in towns_in:
@@ -267,7 +260,11 @@ def scriptRequirements(script_id, script_type):
         """
         cur.execute(query, (script_id, demons_in[i],))
         con.commit()
-    con.close()
+    # The script's characters changed, so its cached bundle is stale (script_bundles needs numpy/pandas,
+    # so it is only imported here rather than on every menu start)
+    import script_bundles
+    script_bundles.invalidate(script_id)
+    name_index.add_script_characters(script_id, towns_in + outs_in + minions_in + demons_in)
     return
 
 
@@ -279,7 +276,7 @@ def addScript(script_name=None):
             script_name = str(input("Enter the name of the custom script:   "))
             
         try:
-            con = sqlite3.connect(db_setup.db_path) 
+            con = db_setup.get_connection()
             cur = con.cursor() 
         except Exception as e:
             print(f'An error occurred: {e}.')
@@ -287,25 +284,9 @@ def addScript(script_name=None):
 
 
 
-        words = script_name.strip().split()
-        for i in range(0,len(words)):
-            if i == 0:
-                script_name = words[i].capitalize()
-            elif 1 <= i and i < len(words):
-                script_name += "_" + words[i].lower()
-            else:
-                script_name += words[i].lower()
-                
-        query = """
-        SELECT *
-        FROM scripts
-        WHERE name = ?
-        """
-
-
-        cur.execute(query, (script_name,))
-        script_exists = cur.fetchall()
-        if script_exists != []:
+        script_name = name_index.script_key(script_name)
+        script_exists = name_index.script(script_name)
+        if script_exists is not None:
             print("This script already exists")
             rename = str(input("Would you like to rename the script?   ")).lower()
             if rename == "y" or rename == "yes":
@@ -331,7 +312,7 @@ def addScript(script_name=None):
     cur.execute(query, (script_name, script_type,))
     con.commit()
     script_id = cur.lastrowid
-    con.close()
+    name_index.add_script(script_name, script_id, script_type)
 
 
     scriptRequirements(script_id, script_type)
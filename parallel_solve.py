@@ -0,0 +1,30 @@
+## PARALLEL SOLVING ##
+# Rerolls are independent (fresh jitter, noise and rule draws each time), so several seeded variants
+# of one problem can be solved at once on a process pool. The problem dict from calcs.load_problem is
+# the shared spec: it is plain DataFrames, dicts and floats, so it pickles to every worker as is.
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import calcs
+
+
+## Seeds for n variants, derived deterministically from one base seed
+def variant_seeds(seed, n):
+    return [int(s) for s in np.random.SeedSequence(seed).generate_state(n)]
+
+
+## Builds and solves one variant (runs in a worker); solve_variant(problem, result.seed) reproduces a result
+def solve_variant(problem, seed, vectorised=calcs.VECTORISED_SCORES, engine=calcs.ENGINE, solver_settings=None):
+    return calcs.generate_assignment(problem, seed, vectorised, engine, solver_settings)
+
+
+## Solves n seeded variants of a problem on a process pool and yields each result as it finishes.
+## Variants that come back without an optimal solution are yielded too (check result.solved).
+def parallel_assignments(problem, n=8, seed=0, max_workers=None, vectorised=calcs.VECTORISED_SCORES,
+                         engine=calcs.ENGINE, solver_settings=None):
+    # Solver threads would compete with the other workers for the same cores
+    solver_settings = dict({"threads": 1}, **(solver_settings or {}))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(solve_variant, problem, variant_seed, vectorised, engine, solver_settings)
+                   for variant_seed in variant_seeds(seed, n)]
+        for future in as_completed(futures):
+            yield future.result()
@@ -1,126 +1,93 @@
 ## POST GAME DATA COLLECTION ##
-import sqlite3
-from rapidfuzz import process
+import numpy as np
 import db_setup
-
-
-## Tries to autocorrect incorrectly entered character names
-def correct_spelling(input_str, valid_entries, threshold=10):
-    match = process.extractOne(input_str, valid_entries, score_cutoff=threshold)
-    return match[0] if match else None
-
-
-## Compute the new strength of a character depending on how it performed throughout the game
-def compute_adjusted_strength(character_id, decay_factor=0.3):
+import name_index
+from model_fit import clear_model_fits
+from aggregates import record_assignment
+from elo import ELO_K, elo_after_games
+
+
+## Recompute the strength of every character that played in a game from how it has performed recently.
+## Runs once per game after all its results are in: one query reads each character's base strength and
+## its last results window, the decay is applied once per character (however many players had it) and
+## every new strength is written in one transaction. With last_game_id, every character that played in
+## games game_id..last_game_id gets one update (used after a bulk import). Returns {character_id: new strength}.
+def update_character_strengths(game_id, decay_factor=0.3, last_game_id=None):
+    con = db_setup.get_connection()
     try:
-        con = sqlite3.connect(db_setup.db_path) 
-        cur = con.cursor() 
-    except Exception as e:
-        print(f'An error occurred: {e}.')
-        exit()
-
-    # Fetch historical base strength
-    query = "SELECT base_strength FROM characters WHERE character_id = ?"
-    cur.execute(query, (character_id,))
-    historical_strength = cur.fetchone()[0]
-
-    # Fetch recent games (e.g. last 10)
-    query = """
-    SELECT a.won, c.alignment
-    FROM assignments a
-    JOIN characters c ON a.character_id = c.character_id
-    WHERE a.character_id = ?
-    ORDER BY a.game_id DESC
-    LIMIT 10
-    """
-    cur.execute(query, (character_id,))
-    recent_games = cur.fetchall()
-
-    # Fallback if there is no historical data
-    if not recent_games:
-        return historical_strength  
-
-    # Compute recent win rate
-    wins = sum([row[0] for row in recent_games])
-    recent_win_rate = wins / len(recent_games)
+        cur = con.cursor()
 
-    # Map win rate to strength, scaling ±25 around 50
-    recent_strength = 50 + (recent_win_rate - 0.5) * 50  
+        # Base strength and recent record (the last 10 results, kept in the aggregate tables) per character
+        query = """
+        SELECT character_id, base_strength, COUNT(recent.won), TOTAL(recent.won)
+        FROM (SELECT DISTINCT character_id FROM assignments WHERE game_id BETWEEN ? AND ?)
+        JOIN characters USING (character_id)
+        LEFT JOIN character_recent_results AS recent USING (character_id)
+        GROUP BY character_id;
+        """
+        cur.execute(query, (game_id, game_id if last_game_id is None else last_game_id))
 
-    # Apply decay-based averaging
-    adjusted_strength = round(decay_factor * recent_strength + (1 - decay_factor) * historical_strength, 2)
+        new_strengths = {}
+        for character_id, historical_strength, recent_games, wins in cur.fetchall():
+            # No history to go on, so the strength stays as it is
+            if not recent_games:
+                continue
 
+            # Map win rate to strength, scaling ±25 around 50, then apply decay-based averaging
+            recent_strength = 50 + (wins / recent_games - 0.5) * 50
+            new_strengths[character_id] = round(decay_factor * recent_strength + (1 - decay_factor) * historical_strength, 2)
 
-    query = """
-    UPDATE characters
-    SET base_strength = ?
-    WHERE character_id = ?;
-    """
-    cur.execute(query, (adjusted_strength, character_id))
-    con.commit()
-    con.close()
-    return round(adjusted_strength, 2)
+        cur.executemany("UPDATE characters SET base_strength = ? WHERE character_id = ?;",
+                        [(strength, character_id) for character_id, strength in new_strengths.items()])
+        con.commit()
+        return new_strengths
 
+    except Exception as e:
+        print(f"Strength update failed: {e}")
+        con.rollback()
+        return {}
 
 
 
-## Update the elo of the people that played the game
-def eloUpdate(game_id):
-    k = 24  # Elo update factor
 
+## Update the elo of the people that played the game: one query for everyone's ratings, the new ratings
+## in NumPy, and the players' ratings and the game's rating snapshots written in a single transaction
+def eloUpdate(game_id, k=ELO_K):
+    con = db_setup.get_connection()
     try:
-        con = sqlite3.connect(db_setup.db_path)
         cur = con.cursor()
 
-        # Fetch all assignments for this game
+        # Everyone in the game with both of their ratings
         query = """
-        SELECT player_id, team, won
-        FROM assignments
-        WHERE game_id = ?;
+        SELECT player_id, team, won, elo_good, elo_evil
+        FROM assignments JOIN players USING (player_id)
+        WHERE game_id = ? AND team IN ('Good', 'Evil');
         """
         cur.execute(query, (game_id,))
-        all_assignments = cur.fetchall()
-
-        # Separate players by team
-        good_ids = [pid for pid, team, _ in all_assignments if team == "Good"]
-        evil_ids = [pid for pid, team, _ in all_assignments if team == "Evil"]
-
-        # Fetch average Elo for each team
-        if good_ids:
-            cur.execute(f"SELECT AVG(elo_good) FROM players WHERE player_id IN ({','.join(map(str, good_ids))})")
-            avg_good_elo = cur.fetchone()[0]
-        else:
-            avg_good_elo = 1500  # fallback
-
-        if evil_ids:
-            cur.execute(f"SELECT AVG(elo_evil) FROM players WHERE player_id IN ({','.join(map(str, evil_ids))})")
-            avg_evil_elo = cur.fetchone()[0]
-        else:
-            avg_evil_elo = 1500  # fallback
-
-        # Update Elo for each player
-        for player_id, team, won in all_assignments:
-            if team == "Good":
-                cur.execute("SELECT elo_good FROM players WHERE player_id = ?", (player_id,))
-                player_elo = cur.fetchone()[0]
-                expected_score = 1 / (1 + 10 ** ((avg_evil_elo - player_elo) / 400))
-                new_elo = int(player_elo + k * (won - expected_score))
-                cur.execute("UPDATE players SET elo_good = ? WHERE player_id = ?", (new_elo, player_id))
-
-            elif team == "Evil":
-                cur.execute("SELECT elo_evil FROM players WHERE player_id = ?", (player_id,))
-                player_elo = cur.fetchone()[0]
-                expected_score = 1 / (1 + 10 ** ((avg_good_elo - player_elo) / 400))
-                new_elo = int(player_elo + k * (won - expected_score))
-                cur.execute("UPDATE players SET elo_evil = ? WHERE player_id = ?", (new_elo, player_id))
+        rows = cur.fetchall()
+
+        if rows:
+            player_ids, teams, won, elo_good, elo_evil = zip(*rows)
+            good = np.array(teams) == "Good"
+            elo_good = np.array(elo_good, dtype=float)
+            elo_evil = np.array(elo_evil, dtype=float)
+            new_elo = elo_after_games(np.zeros(len(good), dtype=int), good, np.array(won, dtype=float), elo_good, elo_evil, k)
+
+            # The side a player didn't play on is written back unchanged
+            new_ratings = list(zip(np.where(good, new_elo, elo_good).tolist(),
+                                   np.where(good, elo_evil, new_elo).tolist(),
+                                   player_ids))
+            cur.executemany("UPDATE players SET elo_good = ?, elo_evil = ? WHERE player_id = ?", new_ratings)
+            # Ratings after this game, for "as of game N" lookups (see elo.py)
+            cur.executemany("INSERT OR REPLACE INTO rating_snapshots (elo_good, elo_evil, player_id, game_id) VALUES(?, ?, ?, ?)",
+                            [ratings + (game_id,) for ratings in new_ratings])
 
         con.commit()
         print("Elo ratings updated successfully.")
 
     except Exception as e:
         print(f"Elo update failed: {e}")
-    finally:
-        con.close()
+        con.rollback()  # don't leave a half-applied update on the shared connection
 
 ## Main function
 def dataCollection():
@@ -130,7 +97,7 @@ def dataCollection():
     num_alive_players = int(input("Enter number of alive players:   "))
 
     try:
-        con = sqlite3.connect(db_setup.db_path) 
+        con = db_setup.get_connection()
         cur = con.cursor() 
     except Exception as e:
         print(f'An error occurred: {e}.')
@@ -140,50 +107,23 @@ def dataCollection():
 
     script = str(input("Enter script/X if unknown name:   "))
 
-    words = script.strip().split()
-    for i in range(0,len(words)):
-        if i == 0:
-            script = words[i].capitalize()
-        elif 1 <= i and i < len(words):
-            script += "_" + words[i].lower()
-        else:
-            script += words[i].lower()
+    script = name_index.script_key(script)
 
-    if script == "x":
+    if script.lower() == "x":
         script = None
-
-        query = """
-        INSERT INTO games (winning_team, player_count, players_alive)
-        VALUES(?, ?, ?);
-        """
+        script_id = None
+    elif name_index.script(script) is None:
+        print("Script", script, "does not exist")
+        return
     else:
-        query = """
-        SELECT script_id
-        FROM scripts
-        WHERE name = ?
-        """
-        cur.execute(query, (script,))
-        script_id = int(cur.fetchall()[0][0])
-        query = """
-        INSERT INTO games (script_id, winning_team, player_count, players_alive)
-        VALUES(?, ?, ?, ?);
-        """
-    cur.execute(query, (script_id, winning_team, num_players, num_alive_players))
-    con.commit()
-
+        script_id = name_index.script(script)[0]
     query = """
-    SELECT name
-    FROM characters 
-    JOIN script_characters ON characters.character_id = script_characters.character_id
-    WHERE script_id = ?
+    INSERT INTO games (script_id, winning_team, player_count, players_alive)
+    VALUES(?, ?, ?, ?);
     """
+    cur.execute(query, (script_id, winning_team, num_players, num_alive_players))
+    con.commit()
 
-    cur.execute(query, (script_id,))
-    valid_char_list = cur.fetchall()
-    temp = zip(*valid_char_list)
-
-    valid_char_list = list(temp)[0]
-    
     query = """
     SELECT game_id
     FROM games
@@ -193,7 +133,6 @@ def dataCollection():
     cur.execute(query)
     game_id = int(cur.fetchall()[0][0])
 
-    con.close()
 
     logged_players = 0
     
@@ -213,7 +152,7 @@ def dataCollection():
             players.append(player)
 
         try:
-            con = sqlite3.connect(db_setup.db_path) 
+            con = db_setup.get_connection()
             cur = con.cursor() 
         except Exception as e:
             print(f'An error occurred: {e}.')
@@ -221,20 +160,12 @@ def dataCollection():
 
 
 
-        query = """
-        SELECT player_id
-        FROM players
-        WHERE name = ?;
-        """
-        
-        cur.execute(query, (player,))
-        player_id = cur.fetchall()
-        if str(player_id) == "[]":
+        player_id = name_index.player_id(player)
+        if player_id is None:
             print("Invalid player name")
             continue
 
 
-        player_id = player_id[0][0]
         query = """
         SELECT *
         FROM assignments
@@ -248,56 +179,30 @@ def dataCollection():
         
 
 
-        valid_char = False
         no_correction = True
-        while valid_char == False:
+        while True:
             if no_correction:
                 char_name = str(input("Enter player's character:   "))
                 char_name = " ".join(word.capitalize() for word in char_name.split())
             no_correction = True
 
-            query = """
-            SELECT character_id, alignment
-            FROM characters
-            WHERE name = ?;
-            """
-
-            
-            cur.execute(query, (char_name,))
-            char = cur.fetchall()
-
-
-            if str(char) == "[]":
+            char = name_index.character(char_name)
+            if char is None:
                 print("Invalid character name")
-                corr = correct_spelling(char_name, valid_char_list)
-                corr = " ".join(word.capitalize() for word in corr.split())
-                did_mean = str(input("Did you mean: " + str(corr) + "?   ")).lower()
-                if did_mean == "yes" or did_mean == "y":
-                    char_name = corr
-                    no_correction = False
+            elif script_id is not None and not name_index.in_script(script_id, char[0]):
+                print("Character not in this script")
             else:
-            
-                char_id = char[0][0]
-                char_align = char[0][1]
-
-                query = """
-                SELECT *
-                FROM script_characters
-                WHERE script_id = ? AND character_id = ?;
-                """
-                cur.execute(query, (script_id,char_id))
-                char = cur.fetchall()
-                if str(char) == "[]":
-                    print("Character not in this script")
-                    corr = correct_spelling(char_name, valid_char_list)
-                    corr = " ".join(word.capitalize() for word in corr.split())
-                    did_mean = str(input("Did you mean: " + str(corr) + "?   ")).lower()
-                    if did_mean == "yes" or did_mean == "y":
-                        char_name = corr
-                        no_correction = False
-
-                else:
-                    valid_char = True
+                char_id, char_align = char[0], char[1]
+                break
+
+            # Closest character on the script (any character if the script is unknown)
+            corr = name_index.suggest('characters', char_name, script_id, threshold=10)
+            if corr is None:
+                continue
+            did_mean = str(input("Did you mean: " + corr + "?   ")).lower()
+            if did_mean == "yes" or did_mean == "y":
+                char_name = corr
+                no_correction = False
         
         team = str(input("Enter player's team:   ")).capitalize()
         
@@ -327,15 +232,16 @@ def dataCollection():
 
 
         cur.execute(query, (game_id, player_id, char_id, team, won, assigned_by))
+        record_assignment(cur, cur.lastrowid, game_id, player_id, char_id, team, won)
         con.commit()
         logged_players += 1
-        con.close()
-        new_strength = compute_adjusted_strength(char_id)
-        print(f"Character {char_id} → Adjusted Strength: {new_strength}")
 
 
 
+    for char_id, new_strength in update_character_strengths(game_id).items():
+        print(f"Character {char_id} → Adjusted Strength: {new_strength}")
     eloUpdate(game_id)
+    clear_model_fits()  # history changed, so cached model fits are stale
 
 
 
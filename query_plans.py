@@ -0,0 +1,100 @@
+## QUERY PLAN CHECKS ##
+# Run with: python query_plans.py [num_assignments]
+# Fails (exit code 1) if any hot query needs a full table scan on a large synthetic database
+import sys
+import sqlite3
+import db_setup
+from synthetic_db import build_synthetic_db
+
+seated_players = tuple(range(1, 11))
+script_chars = tuple(range(1, 26))
+
+# Hot queries (as issued by calcs, post_game_data_collection and script_bundles) -> sample parameters.
+# Names typed at the menus are looked up in name_index, which reads each table once.
+hot_queries = {
+    "recent team history (calcs)": ("""
+    SELECT player_id, team,
+           ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY assignment_id DESC) AS recency
+    FROM player_recent_teams
+    WHERE player_id IN ({});
+    """.format(','.join(['?'] * len(seated_players))), seated_players),
+    "seated players' game data (calcs)": ("""
+    SELECT player_id, character_id, team, games, wins
+    FROM player_character_stats
+    WHERE player_id IN ({})
+    AND character_id IN ({})""".format(','.join(['?'] * len(seated_players)),
+                                       ','.join(['?'] * len(script_chars))),
+    seated_players + script_chars),
+    "script characters (script_bundles)": ("""
+    SELECT character_id, name, alignment, role_type
+    FROM script_characters JOIN characters USING (character_id)
+    WHERE script_id = ?;
+    """, (1,)),
+    "game characters' recent results (update_character_strengths)": ("""
+    SELECT character_id, base_strength, COUNT(recent.won), TOTAL(recent.won)
+    FROM (SELECT DISTINCT character_id FROM assignments WHERE game_id BETWEEN ? AND ?)
+    JOIN characters USING (character_id)
+    LEFT JOIN character_recent_results AS recent USING (character_id)
+    GROUP BY character_id;
+    """, (1, 1)),
+    "game players' ratings (eloUpdate)": ("""
+    SELECT player_id, team, won, elo_good, elo_evil
+    FROM assignments JOIN players USING (player_id)
+    WHERE game_id = ? AND team IN ('Good', 'Evil');
+    """, (1,)),
+    "ratings as of a game (elo.ratings_as_of)": ("""
+    SELECT player_id, elo_good, elo_evil
+    FROM rating_snapshots AS snapshot
+    WHERE player_id IN ({})
+    AND game_id = (SELECT MAX(game_id) FROM rating_snapshots
+                   WHERE player_id = snapshot.player_id AND game_id <= ?);
+    """.format(','.join(['?'] * len(seated_players))), seated_players + (100,)),
+    "players without snapshots (elo.ratings_as_of)": ("""
+    SELECT DISTINCT player_id
+    FROM assignments
+    WHERE player_id IN ({}) AND game_id <= ? AND team IN ('Good', 'Evil')
+    AND NOT EXISTS (SELECT 1 FROM rating_snapshots AS snapshot
+                    WHERE snapshot.player_id = assignments.player_id AND snapshot.game_id BETWEEN 1 AND ?);
+    """.format(','.join(['?'] * len(seated_players))), seated_players + (100, 100)),
+    "player already in game (dataCollection)": ("""
+    SELECT *
+    FROM assignments
+    WHERE game_id = ? AND player_id = ?
+    """, (1, 1)),
+    "script by name (script_bundles)": ("""
+    SELECT script_id FROM scripts WHERE name = ?;
+    """, ("Trouble_brewing",)),
+}
+
+
+## Returns {query name: [plan lines]} for every hot query that falls back to a full scan
+def find_full_scans(con):
+    tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    failures = {}
+    for name, (sql, params) in hot_queries.items():
+        plan = [row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        # "SCAN t" reads the whole table and "SCAN t USING ... INDEX" still walks the whole index;
+        # scans of subqueries, CTEs and constant rows are intermediate results and don't count
+        scans = [line for line in plan if line.startswith("SCAN") and line.split()[1] in tables]
+        if scans:
+            failures[name] = plan
+    return failures
+
+
+def check_query_plans(num_assignments=1_000_000):
+    path = build_synthetic_db(num_assignments)
+    con = sqlite3.connect(path)
+    db_setup.migrate(con)
+    failures = find_full_scans(con)
+    con.close()
+
+    for name in hot_queries:
+        print(f"{'FULL SCAN' if name in failures else 'ok':<10}{name}")
+        for line in failures.get(name, []):
+            print(f"{'':<12}{line}")
+    return not failures
+
+
+if __name__ == "__main__":
+    ok = check_query_plans(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
+    sys.exit(0 if ok else 1)
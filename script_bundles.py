@@ -0,0 +1,83 @@
+## SCRIPT BUNDLES ##
+# The characters on a script only change when new_script adds the script, so each script's characters
+# (with the extra copies from character_constraints already added) are saved as a small .npz file in
+# script_bundles/ next to the database and read back instead of re-running the script query.
+# Strengths change after every game, so they are always read fresh from the characters table.
+import os
+import numpy as np
+import pandas as pd
+import db_setup
+import character_constraints
+
+FIELDS = ['character_id', 'name', 'alignment', 'role_type']
+
+
+## Folder holding the bundles for a database file (None for an in-memory database)
+def bundle_dir(path=None):
+    path = path or db_setup.db_path
+    if path == ":memory:":
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "script_bundles")
+
+
+def bundle_path(script_id, path=None):
+    folder = bundle_dir(path)
+    return None if folder is None else os.path.join(folder, f"script_{script_id}.npz")
+
+
+## Deletes a script's bundle so the next load rebuilds it (every bundle if script_id is None)
+def invalidate(script_id=None, path=None):
+    folder = bundle_dir(path)
+    if folder is None or not os.path.isdir(folder):
+        return
+    names = os.listdir(folder) if script_id is None else [f"script_{script_id}.npz"]
+    for name in names:
+        if name.endswith(".npz") and os.path.exists(os.path.join(folder, name)):
+            os.remove(os.path.join(folder, name))
+
+
+## A script's characters from the database, with the extra copies added
+def _query_characters(cur, script_id):
+    cur.execute("""
+    SELECT character_id, name, alignment, role_type
+    FROM script_characters JOIN characters USING (character_id)
+    WHERE script_id = ?;
+    """, (script_id,))
+    characters = pd.DataFrame(cur.fetchall(), columns=FIELDS)
+    return character_constraints.add_copies(characters)
+
+
+## Writes a bundle through a temporary file, so a reader never sees half a bundle
+def _save(path, characters):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as handle:
+        np.savez(handle,
+                 character_id=characters['character_id'].to_numpy(dtype=np.int64),
+                 **{field: characters[field].to_numpy(dtype=str) for field in FIELDS[1:]})
+    os.replace(temp_path, path)
+
+
+## Characters dataframe for a script (character_id, name, alignment, base_strength, role_type), from its
+## bundle when there is one. Returns None if there is no script with that name.
+def load_characters(cur, script_name):
+    cur.execute("SELECT script_id FROM scripts WHERE name = ?;", (script_name,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    script_id = row[0]
+
+    path = bundle_path(script_id)
+    if path is not None and os.path.exists(path):
+        with np.load(path, allow_pickle=False) as bundle:
+            characters = pd.DataFrame({field: bundle[field] for field in FIELDS})
+    else:
+        characters = _query_characters(cur, script_id)
+        if path is not None:
+            _save(path, characters)
+
+    character_ids = sorted(set(characters['character_id'].tolist()))
+    cur.execute("SELECT character_id, base_strength FROM characters WHERE character_id IN ({})".format(
+        ','.join(['?'] * len(character_ids))), character_ids)
+    characters['base_strength'] = characters['character_id'].map(dict(cur.fetchall()))
+    return characters[['character_id', 'name', 'alignment', 'base_strength', 'role_type']]
@@ -0,0 +1,72 @@
+## OUTCOME SIMULATION ##
+# Monte Carlo estimate of how often Good wins with a given assignment. Each player's win_probability
+# (from the fitted elo/strength model, without the selection jitter in S) is taken as the chance they play
+# their team to a win. In every simulated game each player draws independently, and Good wins when a
+# larger share of the Good players than of the Evil players came through; equal shares are a coin flip.
+# The draws are done in blocks of NumPy arrays, so 100k games take milliseconds.
+import time
+from statistics import NormalDist
+import numpy as np
+
+# Simulated games per call
+DRAWS = 100_000
+
+# Games drawn per block, which caps memory at BLOCK x players booleans
+BLOCK = 50_000
+
+
+## Wilson score interval for a binomial rate (stays inside [0, 1] even near 0% or 100%)
+def wilson_interval(successes, trials, confidence=0.95):
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (rate + z * z / (2 * trials)) / denominator
+    half_width = z * np.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / denominator
+    return centre - half_width, centre + half_width
+
+
+## Simulates draws games of an assignment (the DataFrame in AssignmentResult.assignment). Returns the good-win
+## rate with its confidence interval, or None for an empty assignment. The same seed gives the same draws.
+def simulate_outcomes(assignment, draws=DRAWS, seed=None, confidence=0.95):
+    if assignment is None or assignment.empty:
+        return None
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    win_probability = np.clip(assignment['win_probability'].to_numpy(dtype=float), 0.0, 1.0)
+    good = (assignment['team'] == 'Good').to_numpy()
+    num_good = max(int(good.sum()), 1)
+    num_evil = max(int((~good).sum()), 1)
+
+    # Row sums of these weights over the players who came through give (Good share - Evil share)
+    weights = np.where(good, 1 / num_good, -1 / num_evil)
+    good_wins = 0
+    for done in range(0, draws, BLOCK):
+        block = min(BLOCK, draws - done)
+        came_through = rng.random((block, len(win_probability))) < win_probability
+        margin = came_through @ weights
+        ties = int((np.abs(margin) < 1e-9).sum())
+        good_wins += int((margin >= 1e-9).sum()) + int(rng.binomial(ties, 0.5))
+
+    low, high = wilson_interval(good_wins, draws, confidence)
+    return {
+        'good_win_rate': good_wins / draws,
+        'low': float(low),
+        'high': float(high),
+        'confidence': confidence,
+        'draws': draws,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+## Simulates several candidate assignments on common random numbers (one seed for all of them, so player i
+## gets the same draws in every candidate), which makes the differences between candidates sharper
+def compare_assignments(results, draws=DRAWS, seed=0, confidence=0.95):
+    return [simulate_outcomes(result.assignment, draws, seed, confidence) for result in results]
+
+
+## One-line summary of a simulation report
+def describe(report):
+    if report is None:
+        return "No assignment to simulate"
+    return (f"Good wins {report['good_win_rate']:.1%} of {report['draws']:,} simulated games "
+            f"({report['confidence']:.0%} CI {report['low']:.1%}-{report['high']:.1%})")
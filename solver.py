@@ -0,0 +1,109 @@
+## SOLVER ##
+# Solver selection, warm starts and solve statistics for the character assignment MILP
+import os
+import re
+import time
+import tempfile
+from pulp import PULP_CBC_CMD, HiGHS, LpStatus, LpVariable, lpSum, value
+
+# Defaults for every solve; lower time_limit to cap latency at big tables (the best
+# assignment found so far is used when the limit is hit)
+solver_settings = {
+    "backend": "CBC",     # "CBC" or "HiGHS"
+    "threads": None,      # None lets the solver decide
+    "time_limit": 10,     # seconds
+    "gap": None,          # relative MIP gap to stop at, e.g. 0.01; None solves to optimality
+    "msg": False,         # show the solver log
+}
+
+
+## PuLP's HiGHS solver, seeded with any initial values set on the variables as a (partial) MIP start
+class _WarmStartHiGHS(HiGHS):
+    def callSolver(self, lp):
+        import numpy as np
+
+        start = [(var.index, var.varValue) for var in lp.variables() if var.varValue is not None]
+        if start:
+            indices, values = zip(*start)
+            lp.solverModel.setSolution(len(start), np.array(indices, dtype=np.int32), np.array(values, dtype=float))
+        lp.solverModel.run()
+
+
+## Builds the PuLP solver object for the given settings
+def make_solver(settings, log_path=None):
+    if settings["backend"] == "CBC":
+        return PULP_CBC_CMD(msg=settings["msg"], timeLimit=settings["time_limit"], gapRel=settings["gap"],
+                            threads=settings["threads"], warmStart=True, logPath=log_path)
+    if settings["backend"] == "HiGHS":
+        return _WarmStartHiGHS(msg=settings["msg"], timeLimit=settings["time_limit"], gapRel=settings["gap"],
+                               threads=settings["threads"])
+    raise ValueError(f"Unknown solver backend '{settings['backend']}', expected 'CBC' or 'HiGHS'")
+
+
+## Reads the node count and final gap out of a CBC log
+def _cbc_log_stats(log_path):
+    with open(log_path) as log:
+        text = log.read()
+    nodes = re.search(r"Enumerated nodes:\s+(\d+)", text)
+    gap = re.search(r"^Gap:\s+([-\d.eE+]+)", text, re.MULTILINE)
+    return text, (int(nodes.group(1)) if nodes else None), (float(gap.group(1)) if gap else None)
+
+
+## Solves prob and returns its statistics (status, objective, solve time, node count, gap)
+def solve(prob, settings=None):
+    settings = dict(solver_settings, **(settings or {}))
+    log_path = None
+    if settings["backend"] == "CBC":
+        handle, log_path = tempfile.mkstemp(suffix="-cbc.log")
+        os.close(handle)
+
+    start = time.perf_counter()
+    prob.solve(make_solver(settings, log_path))
+    solve_time = time.perf_counter() - start
+
+    nodes = gap = None
+    if log_path is not None:
+        text, nodes, gap = _cbc_log_stats(log_path)
+        os.remove(log_path)
+        if settings["msg"]:
+            print(text)
+    else:
+        info = prob.solverModel.getInfo()
+        nodes = int(info.mip_node_count)
+        gap = float(info.mip_gap)
+
+    status = LpStatus[prob.status]
+    if gap is None and status == "Optimal":
+        gap = 0.0
+    return {
+        "backend": settings["backend"],
+        "status": status,
+        "objective": value(prob.objective),
+        "solve_time": solve_time,
+        "nodes": nodes,
+        "gap": gap,
+    }
+
+
+## Seeds a reroll with the last assignment and forbids every rejected assignment from coming back exactly.
+## Pruned cells are the constant 0 rather than a variable (see formulation.create_grid) and are skipped.
+def warm_start(prob, x, rejected):
+    for row in x:
+        for var in row:
+            if isinstance(var, LpVariable):
+                var.setInitialValue(0)
+    for i, j in rejected[-1]:
+        if isinstance(x[i][j], LpVariable):
+            x[i][j].setInitialValue(1)
+    for k, pairs in enumerate(rejected):
+        exclude_assignment(prob, x, pairs, 1, f"exclude_rejected_{k}")
+
+
+## Cuts off an assignment: at least min_changes of its players must get a different character
+def exclude_assignment(prob, x, pairs, min_changes=1, name=None):
+    prob += lpSum(x[i][j] for i, j in pairs) <= len(pairs) - min_changes, name
+
+
+## Which (player, character) cells are set in a solved grid
+def chosen_pairs(x):
+    return [(i, j) for i, row in enumerate(x) for j, var in enumerate(row) if value(var) is not None and value(var) > 0.5]
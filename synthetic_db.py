@@ -0,0 +1,73 @@
+## SYNTHETIC DATABASE ##
+# Builds a copy of the real schema (and its script/character reference data) filled with
+# randomly generated players, games and assignments, for benchmarks and query plan checks
+import os
+import sqlite3
+import tempfile
+import numpy as np
+import db_setup
+
+schema_path = os.path.join(db_setup.script_dir, "DB SCHEMA.sql")
+
+
+## Returns the path to a synthetic database with num_assignments rows, reusing an existing build
+def build_synthetic_db(num_assignments, num_players=500, players_per_game=10, seed=0, path=None):
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"clocktower_synthetic_{num_assignments}_{num_players}_{seed}.db")
+
+    if os.path.exists(path):
+        con = sqlite3.connect(path)
+        try:
+            if con.execute("SELECT COUNT(*) FROM assignments").fetchone()[0] == num_assignments:
+                return path
+        except sqlite3.Error:
+            pass
+        finally:
+            con.close()
+        os.remove(path)
+
+    rng = np.random.default_rng(seed)
+    con = sqlite3.connect(path)
+    with open(schema_path) as schema:
+        con.executescript(schema.read())
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("DELETE FROM assignments")
+    con.execute("DELETE FROM games")
+    con.execute("DELETE FROM players")
+
+    con.executemany("INSERT INTO players (player_id, name, elo_good, elo_evil) VALUES(?, ?, ?, ?)",
+                    [(i + 1, f"Player{i + 1}", float(g), float(e))
+                     for i, (g, e) in enumerate(rng.normal(1500, 40, size=(num_players, 2)).round())])
+
+    # Characters available per script, keeping only scripts big enough for a full table
+    script_chars = {}
+    for script_id, character_id, alignment in con.execute("""
+    SELECT script_id, character_id, alignment
+    FROM script_characters JOIN characters USING (character_id)
+    """):
+        script_chars.setdefault(script_id, []).append((character_id, alignment))
+    script_chars = {s: chars for s, chars in script_chars.items() if len(chars) >= players_per_game}
+    script_ids = list(script_chars)
+
+    num_games = -(-num_assignments // players_per_game)
+    games = []
+    assignments = []
+    for game_id in range(1, num_games + 1):
+        script_id = script_ids[rng.integers(len(script_ids))]
+        winning_team = "Good" if rng.random() < 0.5 else "Evil"
+        seats = min(players_per_game, num_assignments - len(assignments))
+        games.append((game_id, script_id, winning_team, seats, int(rng.integers(1, seats + 1))))
+
+        chars = script_chars[script_id]
+        picked = rng.choice(len(chars), size=seats, replace=False)
+        seated = rng.choice(num_players, size=seats, replace=False) + 1
+        for player_id, c in zip(seated, picked):
+            character_id, team = chars[c]
+            assignments.append((game_id, int(player_id), character_id, team, int(team == winning_team), "model"))
+
+    con.executemany("INSERT INTO games (game_id, script_id, winning_team, player_count, players_alive) VALUES(?, ?, ?, ?, ?)", games)
+    con.executemany("INSERT INTO assignments (game_id, player_id, character_id, team, won, assigned_by) VALUES(?, ?, ?, ?, ?, ?)", assignments)
+    con.commit()
+    con.execute("ANALYZE")
+    con.close()
+    return path
@@ -0,0 +1,136 @@
+## TWO-STAGE ENGINE ##
+# Splits the assignment MILP in two. Stage 1 picks which characters are in play with a small selection
+# MILP: one binary per character, with the same role rows and character rules as the full model.
+# Stage 2 matches the players to the chosen characters with a linear assignment solve on S/B.
+#
+# The character rules are written against the x[i][j] grid, so stage 1 hands them a selection grid:
+# row 0 holds the per-character binaries and every other row is an empty expression, which makes
+# each rule's sum over players the "character j is in play" indicator. Once the players are matched,
+# the grid is overwritten in place with the final 0/1 assignment so the post-solve hooks and the
+# output code read it exactly like a solved full model.
+import time
+import numpy as np
+from pulp import LpProblem, LpVariable, LpMinimize, LpBinary, LpAffineExpression, lpSum, value
+import formulation
+import solver
+
+# How many character sets stage 1 proposes; each one is matched and the best is kept
+CANDIDATE_SETS = 3
+
+
+## Creates the selection problem and its grid; exactly num_players characters are selected
+def create_selection_grid(num_players, num_characters):
+    prob = LpProblem("CharacterSelection", LpMinimize)
+    selected = [LpVariable(f"y_{j}", cat=LpBinary) for j in range(num_characters)]
+    x = [selected] + [[LpAffineExpression() for _ in range(num_characters)] for _ in range(num_players - 1)]
+    prob += lpSum(selected) == num_players
+    return prob, x
+
+
+## Stage 1 objective: the full model's balance and objective with every player's scores replaced by a
+## per-character estimate. Bias uses the mean over the better half of the table (only the players who
+## suit a character end up matched to it); strength and noise use the plain table mean.
+def add_selection_objective(prob, x, S, B, noise, teams, tolerance=1.0, column_penalties=None, extra_objective=None):
+    num_players = len(x)
+    column_mean = lambda matrix: np.asarray(matrix, dtype=float).mean(axis=0)
+    top_half = np.sort(np.asarray(B, dtype=float), axis=0)[num_players // 2:].mean(axis=0)
+    tile = lambda row: np.tile(row, (num_players, 1))
+    return formulation.add_balance_and_objective(prob, x, tile(column_mean(S)), tile(top_half), tile(column_mean(noise)),
+                                                 teams, tolerance, column_penalties, extra_objective)
+
+
+## Full-model objective value of a set of pairs, so both engines can be compared on the same scale
+def pair_objective(pairs, S, B, noise, teams, tolerance=1.0, column_penalties=None):
+    column_penalties = column_penalties or {}
+    excess = formulation.excess_imbalance(pairs, S, teams, tolerance)
+    return excess + sum(noise[i][j] - B[i][j] + column_penalties.get(j, 0) for i, j in pairs)
+
+
+## Stage 2: matches every player to one of the selected characters, minimising noise - bias.
+## If the unconstrained matching breaks the balance tolerance, a Lagrangian weight on the balance
+## term is bisected until it fits (or the most balanced matching found is kept).
+def match_players(S, B, noise, columns, teams, tolerance=1.0, iterations=30):
+    from scipy.optimize import linear_sum_assignment
+
+    S = np.asarray(S, dtype=float)
+    columns = np.asarray(columns)
+    num_good = len(teams['Good']) or 1
+    num_evil = len(teams['Evil']) or 1
+    is_good = np.isin(columns, teams['Good'])
+    is_evil = np.isin(columns, teams['Evil'])
+    balance_terms = S[:, columns] * np.where(is_good, 1 / num_good, np.where(is_evil, -1 / num_evil, 0))
+    cost = np.asarray(noise, dtype=float)[:, columns] - np.asarray(B, dtype=float)[:, columns]
+
+    def matching(weight):
+        rows, cols = linear_sum_assignment(cost + weight * balance_terms)
+        return list(zip(rows.tolist(), columns[cols].tolist())), balance_terms[rows, cols].sum()
+
+    pairs, balance = matching(0.0)
+    if abs(balance) <= tolerance:
+        return pairs
+
+    # A positive weight pushes the balance down, a negative one pushes it up
+    direction = np.sign(balance)
+    best_pairs, best_balance = pairs, balance
+    low, high = 0.0, 1.0
+    for _ in range(iterations):
+        pairs, balance = matching(direction * high)
+        if abs(balance) < abs(best_balance):
+            best_pairs, best_balance = pairs, balance
+        if abs(balance) <= tolerance or high > 1e6:
+            break
+        low, high = high, high * 4
+    for _ in range(iterations):
+        if abs(best_balance) > tolerance:
+            break
+        middle = (low + high) / 2
+        pairs, balance = matching(direction * middle)
+        if abs(balance) <= tolerance:
+            high = middle
+            # Smaller weights give more bias back, so keep the lowest weight that still fits
+            best_pairs, best_balance = pairs, balance
+        else:
+            low = middle
+    return best_pairs
+
+
+## Overwrites the selection grid in place with the final assignment (constant 0/1 expressions)
+def materialise(x, pairs):
+    chosen = set(pairs)
+    for i in range(len(x)):
+        x[i][:] = [LpAffineExpression(constant=1 if (i, j) in chosen else 0) for j in range(len(x[i]))]
+
+
+## Runs both stages on a selection problem that already has its rules and role rows. Stage 1 is re-solved
+## with a no-good cut after each candidate character set, and the best matching over the first
+## `candidates` sets is kept, with every stage 1 variable (rule options, Bounty Hunter targets) put back
+## to its value in that candidate so the adjusted requirements and hooks describe it. Returns the stage 1 solver statistics (summed over candidates) plus the
+## matching time; x holds the assignment afterwards.
+def solve(prob, x, S, B, noise, teams, tolerance=1.0, column_penalties=None, settings=None, candidates=CANDIDATE_SETS,
+          extra_objective=None):
+    add_selection_objective(prob, x, S, B, noise, teams, tolerance, column_penalties, extra_objective)
+    selected = list(x[0])
+    best = None
+    match_time = solve_time = 0.0
+    for k in range(candidates):
+        stats = solver.solve(prob, settings)
+        solve_time += stats['solve_time']
+        if stats['status'] != "Optimal":
+            break
+        start = time.perf_counter()
+        columns = [j for j, var in enumerate(selected) if value(var) is not None and value(var) > 0.5]
+        pairs = match_players(S, B, noise, columns, teams, tolerance)
+        objective = pair_objective(pairs, S, B, noise, teams, tolerance, column_penalties)
+        match_time += time.perf_counter() - start
+        if best is None or objective < best[0]:
+            best = (objective, pairs, stats, {var.name: var.varValue for var in prob.variables()})
+        prob += lpSum(selected[j] for j in columns) <= len(columns) - 1, f"exclude_set_{k}"
+
+    if best is None:
+        stats['solve_time'] = solve_time
+        return stats
+    objective, pairs, stats, values = best
+    for var in prob.variables():
+        var.varValue = values.get(var.name)
+    materialise(x, pairs)
+    return dict(stats, objective=objective, solve_time=solve_time + match_time, match_time=match_time)